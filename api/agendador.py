@@ -0,0 +1,150 @@
+import os
+import time
+import asyncio
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+
+from tenacity import AsyncRetrying, retry_if_exception, stop_after_attempt, wait_random_exponential
+
+# --- Agendador de Requisições ao Gemini ---
+# Todas as chamadas ao modelo passam por aqui (ver `ModeloAgendado` em agentes.py). Ele limita quantas
+# requisições ficam em andamento por modelo, distribui as vagas de forma justa entre as sessões de
+# usuário (rodízio) e repete erros 429/5xx com espera exponencial aleatória.
+# Roda inteiramente no loop compartilhado de `agentes`, então não precisa de travas entre threads.
+
+# Sessão de usuário da chamada atual; definida por quem dispara o agente
+sessao_atual: ContextVar[str] = ContextVar("sessao_atual", default="anonima")
+
+CODIGOS_TRANSITORIOS = {429, 500, 502, 503, 504}
+
+
+def erro_transitorio(erro: BaseException) -> bool:
+    # google.genai.errors.APIError expõe o status HTTP em `code`
+    codigo = getattr(erro, "code", None)
+    return codigo in CODIGOS_TRANSITORIOS or isinstance(erro, (ConnectionError, asyncio.TimeoutError))
+
+
+class _FilaJusta:
+    def __init__(self, limite: int):
+        self.limite = limite
+        self.em_andamento = 0
+        self.filas_por_sessao = OrderedDict() # sessão -> deque de futures esperando vaga
+
+    def na_fila(self) -> int:
+        return sum(len(fila) for fila in self.filas_por_sessao.values())
+
+    async def adquirir(self, sessao: str):
+        if self.em_andamento < self.limite and not self.filas_por_sessao:
+            self.em_andamento += 1
+            return
+        pedido = asyncio.get_running_loop().create_future()
+        self.filas_por_sessao.setdefault(sessao, deque()).append(pedido)
+        try:
+            await pedido
+        except asyncio.CancelledError:
+            if pedido.done() and not pedido.cancelled():
+                self.liberar() # A vaga chegou junto com o cancelamento: devolve
+            else:
+                fila = self.filas_por_sessao.get(sessao)
+                if fila is not None and pedido in fila:
+                    fila.remove(pedido)
+                    if not fila:
+                        del self.filas_por_sessao[sessao]
+            raise
+
+    def liberar(self):
+        # Rodízio: a vaga vai para o pedido mais antigo da próxima sessão, que depois vai para o fim da fila
+        while self.filas_por_sessao:
+            sessao, fila = next(iter(self.filas_por_sessao.items()))
+            pedido = fila.popleft()
+            if fila:
+                self.filas_por_sessao.move_to_end(sessao)
+            else:
+                del self.filas_por_sessao[sessao]
+            if not pedido.done():
+                pedido.set_result(None) # A vaga é transferida: em_andamento não muda
+                return
+        self.em_andamento -= 1
+
+
+class AgendadorDeRequisicoes:
+    def __init__(self, max_simultaneas_por_modelo: int, max_tentativas: int, espera_base: float, espera_maxima: float):
+        self.max_simultaneas_por_modelo = max_simultaneas_por_modelo
+        self.max_tentativas = max_tentativas
+        self.espera_base = espera_base
+        self.espera_maxima = espera_maxima
+        self._filas = {}
+        self._esperas = {} # modelo -> últimas esperas por vaga, em segundos
+        self._contadores = {}
+
+    def _fila(self, modelo: str) -> _FilaJusta:
+        if modelo not in self._filas:
+            self._filas[modelo] = _FilaJusta(self.max_simultaneas_por_modelo)
+            self._esperas[modelo] = deque(maxlen=1000)
+            self._contadores[modelo] = {"requisicoes": 0, "novas_tentativas": 0, "falhas": 0}
+        return self._filas[modelo]
+
+    @asynccontextmanager
+    async def vaga(self, modelo: str, sessao: str):
+        fila = self._fila(modelo)
+        inicio = time.perf_counter()
+        await fila.adquirir(sessao)
+        self._esperas[modelo].append(time.perf_counter() - inicio)
+        self._contadores[modelo]["requisicoes"] += 1
+        try:
+            yield
+        finally:
+            fila.liberar()
+
+    def tentativas(self, modelo: str, pode_repetir=lambda: True) -> AsyncRetrying:
+        # `pode_repetir` permite ao chamador vetar a repetição (ex.: parte da resposta já foi entregue)
+        self._fila(modelo)
+        contadores = self._contadores[modelo]
+
+        def _deve_repetir(erro: BaseException) -> bool:
+            if erro_transitorio(erro) and pode_repetir():
+                contadores["novas_tentativas"] += 1
+                return True
+            return False
+
+        return AsyncRetrying(
+            retry=retry_if_exception(_deve_repetir),
+            wait=wait_random_exponential(multiplier=self.espera_base, max=self.espera_maxima),
+            stop=stop_after_attempt(self.max_tentativas),
+            reraise=True,
+        )
+
+    def registrar_falha(self, modelo: str):
+        self._fila(modelo)
+        self._contadores[modelo]["falhas"] += 1
+
+    def estatisticas(self) -> dict:
+        resultado = {}
+        for modelo, fila in self._filas.items():
+            esperas = sorted(self._esperas[modelo])
+            resultado[modelo] = {
+                "em_andamento": fila.em_andamento,
+                "limite": fila.limite,
+                "na_fila": fila.na_fila(),
+                "sessoes_na_fila": len(fila.filas_por_sessao),
+                "espera_media_s": sum(esperas) / len(esperas) if esperas else 0.0,
+                "espera_p95_s": esperas[int(0.95 * (len(esperas) - 1))] if esperas else 0.0,
+                "espera_max_s": esperas[-1] if esperas else 0.0,
+                **self._contadores[modelo],
+            }
+        return resultado
+
+
+_agendador = None
+
+def obter_agendador() -> AgendadorDeRequisicoes:
+    global _agendador
+    if _agendador is None:
+        _agendador = AgendadorDeRequisicoes(
+            max_simultaneas_por_modelo=int(os.getenv("ASSISTENTE_MAX_REQUISICOES_POR_MODELO", 8)),
+            max_tentativas=int(os.getenv("ASSISTENTE_MAX_TENTATIVAS", 4)),
+            espera_base=float(os.getenv("ASSISTENTE_ESPERA_BASE_SEGUNDOS", 1)),
+            espera_maxima=float(os.getenv("ASSISTENTE_ESPERA_MAXIMA_SEGUNDOS", 30)),
+        )
+    return _agendador
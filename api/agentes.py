@@ -0,0 +1,351 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+from functools import cached_property
+
+from google.adk.agents import Agent
+from google.adk.models import BaseLlm, Gemini
+from google.adk.runners import Runner
+from google.adk.sessions import InMemorySessionService
+from google.adk.tools import google_search
+from google.genai import types
+
+from agendador import obter_agendador, sessao_atual
+from cache_de_contexto import aplicar_cache_de_contexto, obter_cache_de_contexto
+from instrumentacao import instrumentar_cliente_genai
+from questoes import ListaDeQuestoes
+
+# --- Registro de Agentes, Runners e Sessões ---
+# Este módulo é importado uma única vez por processo (o Streamlit reexecuta apenas o script
+# principal a cada interação), então tudo o que fica aqui é compartilhado entre reruns e
+# entre usuários: agentes e runners são construídos uma vez e reutilizados.
+
+MODELO_PADRAO = os.getenv("ASSISTENTE_MODELO", "gemini-2.0-flash")
+MODELO_SIMULADO = os.getenv("ASSISTENTE_MODELO_SIMULADO") == "1" # Respostas locais, sem Gemini (ver modelo_simulado.py)
+TEMPO_SESSAO_OCIOSA = float(os.getenv("ASSISTENTE_SESSAO_OCIOSA_SEGUNDOS", 30 * 60))
+
+
+class SessionServiceComExpiracao(InMemorySessionService):
+    """InMemorySessionService de longa duração que descarta sessões ociosas."""
+
+    def __init__(self, tempo_ocioso_segundos: float, intervalo_limpeza_segundos: float = 60):
+        super().__init__()
+        self.tempo_ocioso_segundos = tempo_ocioso_segundos
+        self.intervalo_limpeza_segundos = intervalo_limpeza_segundos
+        self._ultima_limpeza = time.time()
+        self._trava = threading.RLock()
+
+    def create_session(self, **kwargs):
+        with self._trava:
+            if time.time() - self._ultima_limpeza > self.intervalo_limpeza_segundos:
+                self.remover_sessoes_ociosas()
+            return super().create_session(**kwargs)
+
+    def get_session(self, **kwargs):
+        with self._trava:
+            return super().get_session(**kwargs)
+
+    def append_event(self, session, event):
+        with self._trava:
+            return super().append_event(session, event)
+
+    def delete_session(self, **kwargs):
+        with self._trava:
+            return super().delete_session(**kwargs)
+
+    def atualizar_estado(self, app_name: str, user_id: str, session_id: str, atualizar):
+        # `atualizar(estado)` devolve as chaves a mudar; roda sob a trava, então pode ler e reescrever o estado
+        with self._trava:
+            sessao = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+            if sessao is not None:
+                sessao.state.update(atualizar(sessao.state))
+                sessao.last_update_time = time.time() # Conta como atividade para a expiração
+
+    def descartar_eventos(self, app_name: str, user_id: str, session_id: str):
+        # Sessões longas guardam o que precisam no estado; o histórico bruto não precisa crescer
+        with self._trava:
+            sessao = self.sessions.get(app_name, {}).get(user_id, {}).get(session_id)
+            if sessao is not None:
+                sessao.events = []
+
+    def remover_sessoes_ociosas(self) -> int:
+        limite = time.time() - self.tempo_ocioso_segundos
+        removidas = 0
+        with self._trava:
+            for usuarios in list(self.sessions.values()):
+                for user_id, sessoes in list(usuarios.items()):
+                    for session_id, sessao in list(sessoes.items()):
+                        if sessao.last_update_time < limite:
+                            sessoes.pop(session_id, None)
+                            removidas += 1
+                    if not sessoes:
+                        usuarios.pop(user_id, None)
+            self._ultima_limpeza = time.time()
+        return removidas
+
+    def total_sessoes(self) -> int:
+        with self._trava:
+            return sum(len(sessoes) for usuarios in self.sessions.values() for sessoes in usuarios.values())
+
+
+class GeminiInstrumentado(Gemini):
+    """Gemini cujo cliente informa os tokens de cada resposta à medição em andamento (ver instrumentacao.py).
+
+    Instruções de sistema longas vão por cache de contexto (ver cache_de_contexto.py).
+    """
+
+    @cached_property
+    def api_client(self):
+        return instrumentar_cliente_genai(Gemini.api_client.func(self))
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        requisicao = await aplicar_cache_de_contexto(llm_request, self._criar_cache_de_contexto)
+        try:
+            async for resposta in super().generate_content_async(requisicao, stream):
+                yield resposta
+        except Exception:
+            if requisicao.config and requisicao.config.cached_content:
+                obter_cache_de_contexto().invalidar(requisicao.config.cached_content) # Ex.: expirou antes do previsto
+            raise
+
+    async def _criar_cache_de_contexto(self, modelo: str, instrucoes: str, ttl_segundos: float) -> str:
+        cache = await self.api_client.aio.caches.create(
+            model=modelo or self.model,
+            config=types.CreateCachedContentConfig(system_instruction=instrucoes, ttl=f"{int(ttl_segundos)}s"),
+        )
+        return cache.name
+
+
+class ModeloAgendado(BaseLlm):
+    """Encaminha as requisições ao modelo base passando pelo agendador (limite de concorrência, fila justa e novas tentativas)."""
+
+    modelo_base: BaseLlm
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        agendador = obter_agendador()
+        entregou_resposta = False
+        try:
+            # Só repetimos enquanto nada foi entregue: em streaming, repetir duplicaria o texto
+            async for tentativa in agendador.tentativas(self.model, pode_repetir=lambda: not entregou_resposta):
+                with tentativa:
+                    async with agendador.vaga(self.model, sessao_atual.get()):
+                        async for resposta in self.modelo_base.generate_content_async(llm_request, stream):
+                            entregou_resposta = True
+                            yield resposta
+        except Exception:
+            agendador.registrar_falha(self.model)
+            raise
+
+
+# --- Definições dos Agentes ---
+def criar_agente_buscador(modelo) -> Agent:
+    return Agent(
+        name="agente_buscador",
+        model=modelo,
+        description="Agente que busca o estilo da prova.",
+        tools=[google_search],
+        instruction="""
+        Você é um especialista em análises de provas. Sua tarefa é investigar e descrever o estilo das questões de uma prova específica.
+        Use o Google Search para encontrar informações sobre o formato, características e tendências das questões das provas dos últimos 3 anos, a partir da data atual.
+        Sua resposta deve ser uma descrição clara e concisa do estilo da prova, mencionando:
+        - Tipo de questões predominantes (ex: múltipla escolha, discursivas, verdadeiro/falso).
+        - Nível de complexidade (ex: conceitual, aplicação, análise crítica).
+        - Presença de interdisciplinaridade.
+        - Se há pegadinhas comuns ou padrões de cobrança.
+        Este perfil do estilo é crucial para que outros agentes possam gerar questões coerentes e oferecer dicas eficazes.
+        """
+    )
+
+def criar_agente_buscador2(modelo) -> Agent:
+    return Agent(
+        name="agente_buscador2",
+        model=modelo,
+        description="Agente que busca os tópicos mais relevantes da prova.",
+        tools=[google_search],
+        instruction="""
+        Você é um analista de conteúdo de provas e especialista no Princípio de Pareto (80/20).
+        Sua missão é identificar os tópicos mais relevantes e de alta incidência para uma prova e matéria específicas.
+        Use o Google Search para encontrar informações sobre questões e assuntos cobrados com mais frequência nos últimos anos dessa prova e matéria.
+        Aplique o Princípio de Pareto para destilar os 20% dos tópicos que, se dominados, trarão 80% dos resultados esperados.
+        Além disso, pesquise por assuntos da atualidade que tenham maior probabilidade de serem cobrados na prova, considerando a matéria.
+        O resultado deve ser uma lista clara e numerada dos tópicos mais relevantes, pronta para ser usada por um professor para formular questões.
+        """
+    )
+
+def criar_agente_professor(modelo) -> Agent:
+    return Agent(
+        name="agente_professor",
+        model=modelo,
+        description="Agente professor que formula questões",
+        output_schema=ListaDeQuestoes,
+        instruction="""
+        Você é um professor especialista e mestre na formulação de questões de prova.
+        Com base no ESTILO DA PROVA e nos TÓPICOS MAIS RELEVANTES fornecidos, sua tarefa é criar 3 questões desafiadoras e no formato da prova para CADA UM dos tópicos listados.
+        Assegure que as questões sejam:
+        - Claras, objetivas e sem ambiguidades.
+        - Abrangentes, cobrindo diferentes aspectos dos tópicos.
+        - Totalmente alinhadas ao nível de complexidade e tipo de raciocínio exigido pelo ESTILO DA PROVA.
+        Responda apenas com o JSON no esquema pedido, uma entrada por questão:
+        - id: numeração sequencial. Ainda que sejam 3 questões por tópico, a numeração das questões vai de 1-15.
+        - topico: o tópico a que a questão se refere.
+        - enunciado: o texto da pergunta, sem as alternativas.
+        - alternativas: o texto de cada alternativa, na ordem a), b), c)..., sem a letra. Deixe a lista vazia em questões discursivas.
+        - gabarito: em múltipla escolha, somente a letra correta; em discursivas, a resposta esperada de forma resumida.
+        - referencia_resolucao: o conceito ou raciocínio central que justifica o gabarito, em uma frase.
+
+        ESTILO DA PROVA:
+        {estilo_prova}
+
+        TÓPICOS MAIS RELEVANTES:
+        {topicos_relevantes}
+        """
+    )
+
+def criar_agente_professor2(modelo) -> Agent:
+    return Agent(
+        name="agente_professor2",
+        model=modelo,
+        description="Agente professor2 para corrigir e explicar as questões",
+        instruction="""
+        Você é um professor especialista e um avaliador perspicaz. Sua função é analisar as RESPOSTAS do aluno às QUESTÕES propostas.
+        Você receberá apenas as questões que precisam de análise: as de múltipla escolha que o aluno errou ou deixou em branco (já conferidas com o gabarito informado) e as discursivas.
+        Para cada questão, você deve seguir este formato rigoroso:
+
+        1.  **Avaliação da Resposta:** Indique claramente se a resposta do aluno está `Correta`, `Incorreta` ou `Parcialmente Correta`. Justifique brevemente essa avaliação.
+        2.  **Resolução Passo a Passo:** Apresente a solução completa e detalhada para a questão, explicando cada etapa do raciocínio e os conceitos teóricos envolvidos de forma didática. Imagine que você está ensinando a resolução do zero.
+        Na medida do possível, passe 'macetes' conhecidos, populares entre os professóres do ensino médio, para ajudar na memorização.
+        Por exemplo: F=m.a é a fórmula da fama; C=2πr é a fórmula do 'catupyri' (catwopiri)...
+        3.  **Análise de Desempenho e Dicas Personalizadas:** Com base na resposta do aluno, identifique onde ele errou (seja conceitual, de cálculo, interpretação, etc.) ou onde ele acertou e poderia ter aprofundado. Ofereça dicas de estudo **direcionadas** para as dificuldades observadas, sugerindo:
+            - Tópicos específicos para revisão aprofundada.
+            - Estratégias para abordar questões similares no futuro.
+            - Pontos de atenção para evitar erros comuns.
+            - Recursos adicionais, se aplicável (ex: "Revise o conceito X de Y").
+        Seu feedback deve ser construtivo, encorajador e focado em guiar o aluno para a melhoria contínua.
+        """
+    )
+
+FABRICAS_DE_AGENTES = {
+    "agente_buscador": criar_agente_buscador,
+    "agente_buscador2": criar_agente_buscador2,
+    "agente_professor": criar_agente_professor,
+    "agente_professor2": criar_agente_professor2,
+}
+
+_trava_registro = threading.RLock()
+_modelo = None
+_session_service = None
+_agentes = {}
+_runners = {}
+
+
+def obter_modelo():
+    # Uma única instância de Gemini para todos os agentes: o cliente google.genai (e o pool de
+    # conexões HTTP dele) é criado uma vez, em vez de a cada chamada ao modelo.
+    global _modelo
+    with _trava_registro:
+        if _modelo is None:
+            if MODELO_SIMULADO:
+                from modelo_simulado import ModeloSimulado
+                modelo_base = ModeloSimulado(model=MODELO_PADRAO)
+            else:
+                modelo_base = GeminiInstrumentado(model=MODELO_PADRAO)
+            _modelo = ModeloAgendado(model=MODELO_PADRAO, modelo_base=modelo_base)
+        return _modelo
+
+def obter_session_service() -> SessionServiceComExpiracao:
+    global _session_service
+    with _trava_registro:
+        if _session_service is None:
+            _session_service = SessionServiceComExpiracao(TEMPO_SESSAO_OCIOSA)
+        return _session_service
+
+def obter_agente(nome: str) -> Agent:
+    with _trava_registro:
+        if nome not in _agentes:
+            _agentes[nome] = FABRICAS_DE_AGENTES[nome](obter_modelo())
+        return _agentes[nome]
+
+def obter_runner(nome: str) -> Runner:
+    with _trava_registro:
+        if nome not in _runners:
+            _runners[nome] = Runner(agent=obter_agente(nome), app_name=nome, session_service=obter_session_service())
+        return _runners[nome]
+
+
+# --- Loop de Eventos Compartilhado ---
+# O cliente assíncrono do google.genai mantém conexões presas ao loop em que foram abertas.
+# Para reaproveitá-las entre chamadas (e entre usuários), todas as execuções de agentes rodam
+# em um único loop de longa duração, numa thread própria.
+_loop = None
+
+def obter_loop() -> asyncio.AbstractEventLoop:
+    global _loop
+    with _trava_registro:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="assistente-agentes", daemon=True).start()
+        return _loop
+
+def executar_no_loop(coro):
+    return asyncio.run_coroutine_threadsafe(coro, obter_loop()).result()
+
+def iterar_no_loop(gerador_async):
+    # Consome, a partir de código síncrono, um gerador assíncrono que roda no loop compartilhado.
+    # O gerador inteiro roda em uma única tarefa, para que variáveis de contexto (ex.: a sessão
+    # usada pelo agendador) valham do início ao fim.
+    fila = queue.Queue()
+    fim = object()
+
+    async def _consumir():
+        try:
+            async for item in gerador_async:
+                fila.put((item, None))
+        except Exception as e_consumo:
+            fila.put((None, e_consumo))
+        finally:
+            fila.put((fim, None))
+
+    futuro = asyncio.run_coroutine_threadsafe(_consumir(), obter_loop())
+    try:
+        while True:
+            item, erro = fila.get()
+            if erro is not None:
+                raise erro
+            if item is fim:
+                return
+            yield item
+    finally:
+        futuro.cancel() # Se quem consome parar antes do fim (ex.: rerun do Streamlit), interrompe o agente
+
+async def no_loop_compartilhado(coro):
+    # Para quem já tem o próprio loop (ex.: a API HTTP no uvicorn): aguarda sem bloquear esse loop
+    return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(coro, obter_loop()))
+
+async def iterar_no_loop_async(gerador_async):
+    # Equivalente assíncrono de `iterar_no_loop`: os itens atravessam para o loop de quem consome
+    loop_consumidor = asyncio.get_running_loop()
+    fila = asyncio.Queue()
+    fim = object()
+
+    async def _consumir():
+        try:
+            async for item in gerador_async:
+                loop_consumidor.call_soon_threadsafe(fila.put_nowait, (item, None))
+        except Exception as e_consumo:
+            loop_consumidor.call_soon_threadsafe(fila.put_nowait, (None, e_consumo))
+        finally:
+            loop_consumidor.call_soon_threadsafe(fila.put_nowait, (fim, None))
+
+    futuro = asyncio.run_coroutine_threadsafe(_consumir(), obter_loop())
+    try:
+        while True:
+            item, erro = await fila.get()
+            if erro is not None:
+                raise erro
+            if item is fim:
+                return
+            yield item
+    finally:
+        futuro.cancel() # Cliente desconectou antes do fim: interrompe o agente
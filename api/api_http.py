@@ -0,0 +1,146 @@
+import os
+import asyncio
+from contextlib import asynccontextmanager
+from datetime import date
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+
+from aquecimento import AQUECIMENTO_ATIVO, aquecer
+from agentes import MODELO_SIMULADO, no_loop_compartilhado, iterar_no_loop_async
+from questoes import QuestaoGerada, converter_questao
+from servico import (
+    resposta_valida, buscar_estilo_async, buscar_topicos_async, buscar_estilo_e_topicos_async,
+    proximas_questoes_async, preparar_proxima_rodada, preparar_correcao, corrigir_respostas_stream_async,
+)
+
+# --- API HTTP ---
+# O mesmo pipeline do app Streamlit (ver servico.py), sem o modelo de reexecutar o script a cada
+# clique: um único processo uvicorn atende muitos clientes (app mobile, jobs em lote) ao mesmo tempo.
+# As chamadas aos agentes rodam no loop compartilhado de `agentes`, com a mesma fila justa, caches e
+# banco de questões da interface.
+#
+# Uso: uvicorn api_http:app --app-dir api --port 8000
+# O cabeçalho X-Sessao identifica o usuário na fila justa (padrão: o IP do cliente).
+
+if not os.getenv("GOOGLE_API_KEY") and not MODELO_SIMULADO:
+    raise RuntimeError("ERRO CRÍTICO: GOOGLE_API_KEY não configurada!")
+
+@asynccontextmanager
+async def ciclo_de_vida(app: FastAPI):
+    # O uvicorn só começa a aceitar conexões depois do aquecimento
+    if AQUECIMENTO_ATIVO:
+        await asyncio.to_thread(aquecer)
+    yield
+
+app = FastAPI(title="Assistente de Estudos AI", version="1.0", lifespan=ciclo_de_vida)
+
+
+class PedidoEstilo(BaseModel):
+    prova: str = Field(min_length=1)
+    data: Optional[str] = Field(default=None, description="Data de referência (dd/mm/aaaa). Padrão: hoje.")
+
+class PedidoTopicos(BaseModel):
+    prova: str = Field(min_length=1)
+    materia: str = Field(min_length=1)
+
+class PedidoQuestoes(BaseModel):
+    prova: str = Field(min_length=1)
+    materia: str = Field(min_length=1)
+    estilo: Optional[str] = Field(default=None, description="Estilo já obtido em /estilo. Se omitido, é buscado (com cache).")
+    topicos: Optional[str] = Field(default=None, description="Tópicos já obtidos em /topicos. Se omitidos, são buscados (com cache).")
+
+class PedidoCorrecao(BaseModel):
+    questoes: list[QuestaoGerada]
+    respostas: dict[int, str] = Field(description="Resposta do aluno por id da questão: a letra ou o texto discursivo.")
+
+
+def _sessao(request: Request) -> str:
+    return request.headers.get("X-Sessao") or (request.client.host if request.client else "anonima")
+
+def _data_de_hoje(data: Optional[str]) -> str:
+    return data or date.today().strftime("%d/%m/%Y")
+
+def _verificar(resposta: str, erros: list, o_que: str) -> str:
+    if not resposta_valida(resposta):
+        raise HTTPException(status_code=502, detail={"mensagem": f"Não foi possível obter {o_que}.", "erros": erros or [resposta]})
+    return resposta
+
+def _questoes_do_pedido(pedido: PedidoCorrecao):
+    # Mantém os ids do cliente: as respostas vêm indexadas por eles, e o pedido pode trazer só
+    # parte das questões de /questoes, ou em outra ordem. Só a saída do modelo é renumerada.
+    ids = [q.id for q in pedido.questoes]
+    if len(set(ids)) != len(ids):
+        raise HTTPException(status_code=422, detail={"mensagem": "Há questões com o mesmo id no pedido."})
+    return tuple(converter_questao(q, q.id) for q in pedido.questoes)
+
+
+@app.get("/saude")
+async def saude():
+    return {"status": "ok"}
+
+@app.post("/estilo")
+async def estilo(pedido: PedidoEstilo, request: Request):
+    erros = []
+    resposta = await no_loop_compartilhado(buscar_estilo_async(pedido.prova, _data_de_hoje(pedido.data), erros, _sessao(request)))
+    return {"estilo": _verificar(resposta, erros, "o estilo da prova")}
+
+@app.post("/topicos")
+async def topicos(pedido: PedidoTopicos, request: Request):
+    erros = []
+    resposta = await no_loop_compartilhado(buscar_topicos_async(pedido.prova, pedido.materia, erros, _sessao(request)))
+    return {"topicos": _verificar(resposta, erros, "os tópicos relevantes")}
+
+@app.post("/questoes")
+async def questoes(pedido: PedidoQuestoes, request: Request):
+    sessao = _sessao(request)
+    estilo_da_prova, topicos_relevantes = pedido.estilo, pedido.topicos
+    if estilo_da_prova is None or topicos_relevantes is None:
+        erros_estilo, erros_topicos = [], []
+        estilo_buscado, topicos_buscados = await no_loop_compartilhado(
+            buscar_estilo_e_topicos_async(pedido.prova, pedido.materia, _data_de_hoje(None), erros_estilo, erros_topicos, sessao)
+        )
+        estilo_da_prova = estilo_da_prova or _verificar(estilo_buscado, erros_estilo, "o estilo da prova")
+        topicos_relevantes = topicos_relevantes or _verificar(topicos_buscados, erros_topicos, "os tópicos relevantes")
+
+    erros = []
+    questoes_geradas, resposta = await no_loop_compartilhado(
+        proximas_questoes_async(pedido.prova, pedido.materia, estilo_da_prova, topicos_relevantes, erros, sessao)
+    )
+    if not questoes_geradas:
+        raise HTTPException(status_code=502, detail={"mensagem": "Não foi possível gerar as questões.", "erros": erros or [resposta]})
+    # Consulta o SQLite: fora do loop do uvicorn
+    await asyncio.to_thread(preparar_proxima_rodada, pedido.prova, pedido.materia, estilo_da_prova, topicos_relevantes)
+    return {"estilo": estilo_da_prova, "topicos": topicos_relevantes, "questoes": [q._asdict() for q in questoes_geradas]}
+
+@app.post("/correcao")
+async def correcao(pedido: PedidoCorrecao, request: Request):
+    questoes_do_aluno = _questoes_do_pedido(pedido)
+    correcao_local, resumo_local, entrada = preparar_correcao(questoes_do_aluno, pedido.respostas)
+    erros = []
+    pedacos = []
+    async for pedaco in iterar_no_loop_async(corrigir_respostas_stream_async(resumo_local, entrada, erros, _sessao(request))):
+        pedacos.append(pedaco)
+    return {
+        "corretas": [q.id for q in correcao_local.corretas],
+        "total_objetivas": correcao_local.total_objetivas,
+        "correcao": "".join(pedacos),
+        "erros": erros,
+    }
+
+@app.post("/correcao/stream")
+async def correcao_stream(pedido: PedidoCorrecao, request: Request):
+    # Texto em partes (chunked), na ordem em que o agente gera: o resumo local chega primeiro
+    # (o status 200 já saiu quando o agente falha, então os erros vão num último trecho do texto)
+    _, resumo_local, entrada = preparar_correcao(_questoes_do_pedido(pedido), pedido.respostas)
+    erros = []
+
+    async def _texto():
+        async for pedaco in iterar_no_loop_async(corrigir_respostas_stream_async(resumo_local, entrada, erros, _sessao(request))):
+            yield pedaco
+        if erros:
+            yield "\n\nErro na correção: " + "; ".join(erros)
+
+    return StreamingResponse(_texto(), media_type="text/plain; charset=utf-8")
@@ -0,0 +1,64 @@
+import os
+import time
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+# --- Aquecimento ---
+# Importa os módulos pesados (google.adk, google.genai, OpenTelemetry) e constrói agentes, runners,
+# o cliente do Gemini, o loop compartilhado e os caches antes de o servidor aceitar conexões, para
+# que o primeiro usuário de um container recém-criado não pague o cold start.
+# Chamado por iniciar.py (Streamlit) e pelo lifespan de api_http.py; ASSISTENTE_AQUECER=0 desativa.
+
+AQUECIMENTO_ATIVO = os.getenv("ASSISTENTE_AQUECER", "1") == "1"
+
+
+def aquecer() -> dict:
+    duracoes = {}
+    inicio = time.perf_counter()
+
+    def _medir(nome, funcao):
+        inicio_etapa = time.perf_counter()
+        try:
+            funcao()
+        except Exception as e_aquecimento:
+            # Aquecer é só uma otimização: o que falhar aqui é refeito na primeira chamada
+            logger.warning("Aquecimento: etapa '%s' falhou: %s", nome, e_aquecimento)
+        duracoes[nome] = time.perf_counter() - inicio_etapa
+
+    def _importar():
+        import servico # noqa: F401 (traz agentes, instrumentacao e o ADK)
+
+    def _construir_agentes():
+        from agentes import FABRICAS_DE_AGENTES, obter_runner
+        for nome in FABRICAS_DE_AGENTES:
+            obter_runner(nome)
+
+    def _criar_cliente():
+        from agentes import obter_modelo
+        modelo_base = obter_modelo().modelo_base
+        if hasattr(modelo_base, "api_client"): # O modelo simulado não tem cliente
+            modelo_base.api_client
+
+    def _iniciar_loop():
+        from agentes import executar_no_loop
+        executar_no_loop(asyncio.sleep(0))
+
+    def _abrir_caches():
+        from servico import obter_cache_estilo, obter_cache_topicos, obter_banco_questoes
+        obter_cache_estilo()
+        obter_cache_topicos()
+        obter_banco_questoes()
+
+    _medir("importacao", _importar)
+    _medir("agentes", _construir_agentes)
+    _medir("cliente_gemini", _criar_cliente)
+    _medir("loop", _iniciar_loop)
+    _medir("caches", _abrir_caches)
+    duracoes["total"] = time.perf_counter() - inicio
+    logger.info(
+        "Aquecimento concluído em %.2fs (%s)",
+        duracoes["total"], ", ".join(f"{nome} {segundos:.2f}s" for nome, segundos in duracoes.items() if nome != "total"),
+    )
+    return duracoes
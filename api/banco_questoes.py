@@ -0,0 +1,140 @@
+import os
+import time
+import sqlite3
+import asyncio
+import hashlib
+import logging
+import threading
+from contextlib import closing
+
+from cache_persistente import CAMINHO_CACHE_PADRAO, normalizar_chave
+
+logger = logging.getLogger(__name__)
+
+
+class BancoQuestoes:
+    """Estoque de lotes de questões pré-gerados por (prova, matéria, estilo), compartilhado entre sessões.
+
+    Cada lote é entregue a um único aluno (é retirado do banco). Quando o estoque de uma chave fica
+    abaixo de `minimo`, novos lotes são gerados em segundo plano até chegar a `alvo`. Se a geração
+    falhar, a chave só volta a ser reabastecida depois de `espera_apos_falha` segundos.
+    """
+
+    def __init__(
+        self, gerar_lote, minimo: int, alvo: int, ttl_segundos: float, espera_apos_falha: float = 300,
+        caminho: str = CAMINHO_CACHE_PADRAO,
+    ):
+        # gerar_lote: corrotina (estilo, topicos) -> texto do lote, ou None se a geração falhar
+        self.gerar_lote = gerar_lote
+        self.minimo = minimo
+        self.alvo = max(alvo, minimo)
+        self.ttl_segundos = ttl_segundos
+        self.espera_apos_falha = espera_apos_falha
+        self.caminho = caminho
+        self._em_reabastecimento = set()
+        self._ultima_falha = {} # chave -> instante da última falha de geração
+        self._trava = threading.Lock()
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS banco_questoes (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    chave TEXT NOT NULL,
+                    lote TEXT NOT NULL,
+                    criado_em REAL NOT NULL
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_banco_questoes_chave ON banco_questoes (chave, id)")
+
+    @staticmethod
+    def chave(prova: str, materia: str, estilo: str) -> str:
+        # O estilo é um texto longo: entra na chave apenas como hash
+        resumo_estilo = hashlib.sha1(estilo.encode("utf-8")).hexdigest()[:16]
+        return f"{normalizar_chave(prova, materia)}|{resumo_estilo}"
+
+    def _conectar(self) -> sqlite3.Connection:
+        return sqlite3.connect(self.caminho, timeout=10)
+
+    def disponiveis(self, chave: str) -> int:
+        limite = time.time() - self.ttl_segundos
+        with closing(self._conectar()) as conn:
+            (total,) = conn.execute(
+                "SELECT COUNT(*) FROM banco_questoes WHERE chave = ? AND criado_em >= ?", (chave, limite)
+            ).fetchone()
+        return total
+
+    def guardar(self, chave: str, lote: str):
+        with closing(self._conectar()) as conn, conn:
+            conn.execute(
+                "INSERT INTO banco_questoes (chave, lote, criado_em) VALUES (?, ?, ?)", (chave, lote, time.time())
+            )
+
+    def retirar(self, chave: str):
+        # Retira o lote mais antigo ainda válido; a transação IMMEDIATE garante que dois
+        # workers nunca entreguem o mesmo lote.
+        limite = time.time() - self.ttl_segundos
+        try:
+            with closing(self._conectar()) as conn:
+                conn.isolation_level = None
+                conn.execute("BEGIN IMMEDIATE")
+                try:
+                    conn.execute("DELETE FROM banco_questoes WHERE chave = ? AND criado_em < ?", (chave, limite))
+                    linha = conn.execute(
+                        "SELECT id, lote FROM banco_questoes WHERE chave = ? ORDER BY id LIMIT 1", (chave,)
+                    ).fetchone()
+                    if linha is not None:
+                        conn.execute("DELETE FROM banco_questoes WHERE id = ?", (linha[0],))
+                    conn.execute("COMMIT")
+                except Exception:
+                    conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e_banco:
+            logger.warning("Falha ao retirar lote do banco de questões: %s", e_banco)
+            return None
+        return linha[1] if linha is not None else None
+
+    def garantir_estoque(self, chave: str, estilo: str, topicos: str, loop: asyncio.AbstractEventLoop):
+        # Agenda o reabastecimento em segundo plano (no loop compartilhado dos agentes) e retorna na hora
+        with self._trava:
+            if chave in self._em_reabastecimento:
+                return
+            # Durante uma indisponibilidade do modelo (ex.: cota esgotada), não insistimos a cada visita
+            if time.time() - self._ultima_falha.get(chave, float("-inf")) < self.espera_apos_falha:
+                return
+            try:
+                if self.disponiveis(chave) >= self.minimo:
+                    return
+            except sqlite3.Error as e_banco:
+                logger.warning("Falha ao consultar o banco de questões: %s", e_banco)
+                return
+            self._em_reabastecimento.add(chave)
+        asyncio.run_coroutine_threadsafe(self._reabastecer(chave, estilo, topicos), loop)
+
+    def reabastecimentos_pendentes(self) -> int:
+        with self._trava:
+            return len(self._em_reabastecimento)
+
+    async def _reabastecer(self, chave: str, estilo: str, topicos: str):
+        # As operações no SQLite rodam em uma thread auxiliar, fora do loop compartilhado dos agentes
+        falhou = False
+        try:
+            while await asyncio.to_thread(self.disponiveis, chave) < self.alvo:
+                lote = await self.gerar_lote(estilo, topicos)
+                if lote is None: # Não insiste se o modelo falhar; tenta de novo depois da espera
+                    falhou = True
+                    break
+                await asyncio.to_thread(self.guardar, chave, lote)
+        except Exception as e_reabastecer:
+            falhou = True
+            logger.warning("Falha ao reabastecer o banco de questões: %s", e_reabastecer)
+        finally:
+            with self._trava:
+                self._em_reabastecimento.discard(chave)
+                if falhou:
+                    self._ultima_falha[chave] = time.time()
+                else:
+                    self._ultima_falha.pop(chave, None)
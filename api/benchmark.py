@@ -0,0 +1,265 @@
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+# --- Benchmark Offline ---
+# Simula N sessões simultâneas percorrendo todas as etapas do app (inicio → responder_questoes →
+# ver_correcao → mais questões → nova_materia) com o `ModeloSimulado` no lugar do Gemini, sem gastar
+# cota. Cada sessão é um AppTest do Streamlit rodando o streamlit_app.py de verdade, no mesmo processo:
+# caches, banco de questões, fila justa e loop compartilhado são os mesmos da produção.
+#
+# Uso: python api/benchmark.py --sessoes 20 --latencia 0.5 --json resultado.json
+
+CAMINHO_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Benchmark offline do Assistente de Estudos com um Gemini simulado.")
+    parser.add_argument("--sessoes", type=int, default=10, help="Sessões simultâneas.")
+    parser.add_argument("--rodadas", type=int, default=1, help="Quantas vezes cada sessão pede 'Mais Questões'.")
+    parser.add_argument("--pares-distintos", type=int, default=None,
+                        help="Pares prova/matéria distintos entre as sessões (padrão: um por sessão, sem acertos de cache entre elas).")
+    parser.add_argument("--latencia", type=float, default=0.5, help="Latência base de cada resposta do modelo, em segundos.")
+    parser.add_argument("--latencia-busca", type=float, default=1.0, help="Latência extra das chamadas com google_search.")
+    parser.add_argument("--palavras", type=int, default=300, help="Palavras por resposta em texto.")
+    parser.add_argument("--questoes", type=int, default=15, help="Questões por lote do agente_professor.")
+    parser.add_argument("--cache-db", default=None, help="Arquivo SQLite do cache (padrão: um arquivo temporário, cache frio).")
+    parser.add_argument("--timeout", type=float, default=300, help="Tempo máximo de cada interação, em segundos.")
+    parser.add_argument("--json", default=None, help="Grava o relatório completo neste arquivo.")
+    return parser.parse_args()
+
+
+def _configurar_ambiente(args):
+    # Precisa acontecer antes de importar os módulos do app, que leem as variáveis na importação
+    os.environ["ASSISTENTE_MODELO_SIMULADO"] = "1"
+    os.environ.setdefault("GOOGLE_API_KEY", "simulado")
+    os.environ["ASSISTENTE_SIMULADO_LATENCIA_SEGUNDOS"] = str(args.latencia)
+    os.environ["ASSISTENTE_SIMULADO_LATENCIA_BUSCA_SEGUNDOS"] = str(args.latencia_busca)
+    os.environ["ASSISTENTE_SIMULADO_PALAVRAS"] = str(args.palavras)
+    os.environ["ASSISTENTE_SIMULADO_QUESTOES"] = str(args.questoes)
+    os.environ["ASSISTENTE_CACHE_DB"] = args.cache_db or os.path.join(tempfile.mkdtemp(prefix="assistente-bench-"), "cache.sqlite3")
+
+
+def _preparar_apptest():
+    # O AppTest foi feito para um teste por vez: cada execução troca o singleton `Runtime` por um
+    # mock e o zera no fim, o que quebra as outras sessões rodando em paralelo. Fixamos um único
+    # runtime simulado para o processo inteiro, como no servidor real.
+    from unittest.mock import MagicMock
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+    from streamlit.testing.v1 import element_tree
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    Runtime.instance = classmethod(lambda cls: runtime)
+    Runtime.exists = classmethod(lambda cls: True)
+
+    # Depois de um st.rerun() no meio da execução, o AppTest ainda enxerga widgets da execução
+    # interrompida e falha ao ler o estado deles; esses widgets não existem mais, então são ignorados.
+    get_widget_state_original = element_tree.get_widget_state
+
+    def get_widget_state(node):
+        try:
+            return get_widget_state_original(node)
+        except KeyError:
+            return None
+
+    element_tree.get_widget_state = get_widget_state
+
+
+def memoria_residente_mb() -> float:
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except (OSError, ValueError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024 # Pico, em sistemas sem /proc
+
+
+class SessaoSimulada:
+    def __init__(self, indice: int, prova: str, materia: str, args):
+        from streamlit.testing.v1 import AppTest
+
+        self.indice = indice
+        self.prova = prova
+        self.materia = materia
+        self.rodadas = args.rodadas
+        self.app = AppTest.from_file(CAMINHO_APP, default_timeout=args.timeout)
+        self.etapas = [] # (nome, segundos)
+        self.erro = None
+        self.duracao_total = 0.0
+
+    def _medir(self, nome: str, acao, etapa_esperada: str):
+        inicio = time.perf_counter()
+        acao()
+        self.etapas.append((nome, time.perf_counter() - inicio))
+        if self.app.exception:
+            raise RuntimeError(f"{nome}: {self.app.exception[0].message}")
+        if self.app.session_state.etapa != etapa_esperada:
+            erros = "; ".join(e.value for e in self.app.error)
+            raise RuntimeError(f"{nome}: ficou na etapa '{self.app.session_state.etapa}' ({erros})")
+
+    def _clicar(self, rotulo: str):
+        next(botao for botao in self.app.button if botao.label.startswith(rotulo)).click().run()
+
+    def _responder(self):
+        # Alterna acertos e erros para que a correção local e o agente_professor2 tenham trabalho
+        for posicao, radio in enumerate(self.app.radio):
+            radio.set_value(radio.options[0][0] if posicao % 2 else "b")
+        for area in self.app.text_area:
+            area.input("Resposta discursiva simulada.")
+        self._medir("correcao", lambda: self._clicar("Enviar Respostas"), "ver_correcao")
+
+    def executar(self):
+        inicio = time.perf_counter()
+        try:
+            self._medir("carregar", self.app.run, "inicio")
+            self.app.text_input[0].input(self.prova)
+            self.app.text_input[1].input(self.materia)
+            self._medir("inicio", lambda: self._clicar("Iniciar Estudos"), "responder_questoes")
+            self._responder()
+            for _ in range(self.rodadas):
+                self._medir("mais_questoes", lambda: self._clicar("Mais Questões"), "responder_questoes")
+                self._responder()
+            self._medir("outra_materia", lambda: self._clicar("Estudar Outra Matéria"), "nova_materia")
+            self.app.text_input[0].input(f"{self.materia} II")
+            self._medir("nova_materia", lambda: self._clicar("Estudar esta Nova Matéria"), "responder_questoes")
+        except Exception as e_sessao:
+            self.erro = f"{type(e_sessao).__name__}: {e_sessao}"
+        self.duracao_total = time.perf_counter() - inicio
+        return self
+
+
+def _resumo(valores: list) -> dict:
+    from instrumentacao import percentil
+
+    valores = sorted(valores)
+    return {
+        "n": len(valores),
+        "media_s": sum(valores) / len(valores) if valores else 0.0,
+        "p50_s": percentil(valores, 50),
+        "p95_s": percentil(valores, 95),
+        "p99_s": percentil(valores, 99),
+        "max_s": valores[-1] if valores else 0.0,
+    }
+
+
+def executar_benchmark(args) -> dict:
+    _configurar_ambiente(args)
+    _preparar_apptest()
+    from streamlit.testing.v1 import AppTest
+    from agendador import obter_agendador
+    from agentes import obter_session_service
+    from aquecimento import aquecer
+    from instrumentacao import agregador
+    from servico import obter_banco_questoes
+
+    pares_distintos = args.pares_distintos or args.sessoes
+    sessoes = [
+        SessaoSimulada(indice, f"Prova {indice % pares_distintos}", f"Matéria {indice % pares_distintos}", args)
+        for indice in range(args.sessoes)
+    ]
+    # Aquecimento (módulos, agentes, loop e caches) antes de medir a memória das sessões
+    aquecer()
+    AppTest.from_file(CAMINHO_APP, default_timeout=args.timeout).run()
+    memoria_inicial = memoria_residente_mb()
+    agregador.limpar()
+
+    inicio = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.sessoes, thread_name_prefix="sessao") as executor:
+        concluidas = list(executor.map(SessaoSimulada.executar, sessoes))
+    duracao = time.perf_counter() - inicio
+    # Medida com todas as sessões ainda vivas (o estado delas continua em memória)
+    memoria_final = memoria_residente_mb()
+    # Reabastecimentos do banco de questões agendados pelas sessões ainda rodam no loop compartilhado:
+    # esperamos que terminem antes de ler as métricas (e antes de o processo encerrar)
+    banco = obter_banco_questoes()
+    limite_espera = time.perf_counter() + args.timeout
+    while banco.reabastecimentos_pendentes() and time.perf_counter() < limite_espera:
+        time.sleep(0.05)
+
+    por_etapa = {}
+    for sessao in concluidas:
+        for nome, segundos in sessao.etapas:
+            por_etapa.setdefault(nome, []).append(segundos)
+    bem_sucedidas = [sessao for sessao in concluidas if sessao.erro is None]
+    # As gerações em segundo plano ficam à parte, para a vazão por sessão ser comparável entre versões
+    por_agente, segundo_plano = {}, {}
+    for nome, valores in agregador.estatisticas().items():
+        (segundo_plano if valores["segundo_plano"] else por_agente)[nome] = valores
+    chamadas_agentes = sum(valores["chamadas"] for valores in por_agente.values())
+
+    return {
+        "parametros": vars(args),
+        "duracao_s": duracao,
+        "sessoes": len(concluidas),
+        "sessoes_com_erro": len(concluidas) - len(bem_sucedidas),
+        "erros": [f"sessão {sessao.indice}: {sessao.erro}" for sessao in concluidas if sessao.erro],
+        "vazao_sessoes_por_s": len(bem_sucedidas) / duracao if duracao else 0.0,
+        "vazao_chamadas_agentes_por_s": chamadas_agentes / duracao if duracao else 0.0,
+        "ponta_a_ponta": _resumo([sessao.duracao_total for sessao in bem_sucedidas]),
+        "por_etapa": {nome: _resumo(valores) for nome, valores in por_etapa.items()},
+        "por_agente": por_agente,
+        "segundo_plano": segundo_plano,
+        "reabastecimentos_nao_concluidos": banco.reabastecimentos_pendentes(),
+        "memoria_mb": {
+            "inicial": memoria_inicial,
+            "final": memoria_final,
+            "por_sessao": (memoria_final - memoria_inicial) / len(concluidas) if concluidas else 0.0,
+        },
+        "agendador": {
+            modelo: {chave: valor for chave, valor in valores.items() if chave not in ("em_andamento", "na_fila", "sessoes_na_fila")}
+            for modelo, valores in obter_agendador().estatisticas().items()
+        },
+        "sessoes_de_agentes_restantes": obter_session_service().total_sessoes(),
+    }
+
+
+def imprimir_relatorio(relatorio: dict):
+    print(f"\nSessões: {relatorio['sessoes']} ({relatorio['sessoes_com_erro']} com erro) em {relatorio['duracao_s']:.2f}s")
+    print(f"Vazão: {relatorio['vazao_sessoes_por_s']:.2f} sessões/s, {relatorio['vazao_chamadas_agentes_por_s']:.2f} chamadas a agentes/s")
+    memoria = relatorio["memoria_mb"]
+    print(f"Memória residente: {memoria['inicial']:.1f} → {memoria['final']:.1f} MB (~{memoria['por_sessao']:.2f} MB por sessão)")
+
+    print(f"\n{'':<22}{'n':>5}{'média':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'máx':>9}")
+    linhas = [("ponta a ponta", relatorio["ponta_a_ponta"])]
+    linhas += [(f"etapa {nome}", valores) for nome, valores in relatorio["por_etapa"].items()]
+    for nome, valores in linhas:
+        print(f"{nome:<22}{valores['n']:>5}{valores['media_s']:>9.3f}{valores['p50_s']:>9.3f}"
+              f"{valores['p95_s']:>9.3f}{valores['p99_s']:>9.3f}{valores['max_s']:>9.3f}")
+
+    print(f"\n{'agente':<34}{'chamadas':>9}{'erros':>7}{'p50':>9}{'p95':>9}{'p99':>9}{'entrada/ch':>12}{'em cache/ch':>13}{'saída/ch':>10}")
+    for titulo, por_agente in (("", relatorio["por_agente"]), ("em segundo plano (banco de questões):\n", relatorio["segundo_plano"])):
+        if titulo and por_agente:
+            print(titulo, end="")
+        for nome, valores in sorted(por_agente.items()):
+            chamadas = max(valores["chamadas"], 1)
+            print(f"{nome:<34}{valores['chamadas']:>9}{valores['erros']:>7}{valores['p50_s']:>9.3f}{valores['p95_s']:>9.3f}"
+                  f"{valores['p99_s']:>9.3f}{valores['tokens_entrada'] // chamadas:>12}"
+                  f"{valores['tokens_em_cache'] // chamadas:>13}{valores['tokens_saida'] // chamadas:>10}")
+    if relatorio["reabastecimentos_nao_concluidos"]:
+        print(f"{relatorio['reabastecimentos_nao_concluidos']} reabastecimentos do banco não terminaram a tempo")
+
+    chamadas_segundo_plano = sum(valores["chamadas"] for valores in relatorio["segundo_plano"].values())
+    for modelo, valores in relatorio["agendador"].items():
+        print(f"\nFila do modelo {modelo}: espera p95 {valores['espera_p95_s']:.3f}s, máx {valores['espera_max_s']:.3f}s, "
+              f"{valores['requisicoes']} requisições, {chamadas_segundo_plano} delas em segundo plano (limite {valores['limite']} simultâneas)")
+    for erro in relatorio["erros"]:
+        print(f"ERRO {erro}")
+
+
+if __name__ == "__main__":
+    args = _argumentos()
+    relatorio = executar_benchmark(args)
+    imprimir_relatorio(relatorio)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
+    sys.exit(1 if relatorio["sessoes_com_erro"] else 0)
@@ -0,0 +1,118 @@
+import os
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# --- Cache de Contexto do Gemini ---
+# A API do Gemini não guarda estado entre requisições: as instruções de sistema vão inteiras em
+# toda chamada. Nas do agente_professor elas carregam o estilo e os tópicos da prova, um prefixo
+# longo que se repete em todas as rodadas (e entre alunos e lotes do banco da mesma prova e
+# matéria). Esse prefixo vira um cache de contexto explícito (caches.create), e a requisição passa
+# a levar só o nome do cache (config.cached_content) e a mensagem da rodada. Os tokens em cache
+# são cobrados com desconto e aparecem em tokens_em_cache (ver instrumentacao.py).
+#
+# Instruções abaixo de ASSISTENTE_CACHE_CONTEXTO_MIN_TOKENS e requisições com ferramentas seguem
+# como antes. Se a criação falhar (ex.: modelo com mínimo maior), a chave fica sem cache até o fim
+# do TTL, em vez de tentar de novo a cada rodada.
+
+ATIVO = os.getenv("ASSISTENTE_CACHE_CONTEXTO", "1") == "1"
+MIN_TOKENS = int(os.getenv("ASSISTENTE_CACHE_CONTEXTO_MIN_TOKENS", 1024))
+TTL_SEGUNDOS = float(os.getenv("ASSISTENTE_CACHE_CONTEXTO_TTL", 900))
+MAX_ENTRADAS = int(os.getenv("ASSISTENTE_CACHE_CONTEXTO_MAX", 256))
+MARGEM_EXPIRACAO_SEGUNDOS = 60 # Um cache perto de expirar não é mais usado: criamos outro
+CARACTERES_POR_TOKEN = 4 # Estimativa, só para não tentar cachear instruções curtas demais
+
+
+class CacheDeContexto:
+    """Nomes dos caches de contexto do Gemini por (modelo, instruções de sistema), com validade.
+
+    `criar_cache` é uma corrotina (modelo, instrucoes, ttl_segundos) -> nome do cache; cada modelo
+    base passa a sua (o Gemini usa caches.create, o modelo simulado guarda as instruções em memória).
+    """
+
+    def __init__(self, min_tokens: int = MIN_TOKENS, ttl_segundos: float = TTL_SEGUNDOS, max_entradas: int = MAX_ENTRADAS):
+        self.min_tokens = min_tokens
+        self.ttl_segundos = ttl_segundos
+        self.max_entradas = max_entradas
+        self._entradas = OrderedDict() # chave -> (nome do cache, ou None se a criação falhou; expira_em)
+        self._criando = {} # chave -> tarefa de criação em andamento (só no loop compartilhado)
+        self._trava = threading.Lock() # As estatísticas são lidas na thread do Streamlit
+        self._contadores = {"criados": 0, "reutilizados": 0, "falhas": 0}
+
+    async def aplicar(self, llm_request, criar_cache):
+        # Devolve a requisição a enviar: com cached_content no lugar das instruções, se houver cache
+        config = llm_request.config
+        instrucoes = config.system_instruction if config else None
+        if not isinstance(instrucoes, str) or config.tools or config.cached_content:
+            return llm_request
+        if len(instrucoes) < self.min_tokens * CARACTERES_POR_TOKEN:
+            return llm_request
+        nome = await self._obter_nome(llm_request.model, instrucoes, criar_cache)
+        if nome is None:
+            return llm_request
+        return llm_request.model_copy(update={
+            "config": config.model_copy(update={"system_instruction": None, "cached_content": nome}),
+        })
+
+    def invalidar(self, nome: str):
+        # Chamado quando uma requisição com o cache falha: a próxima tentativa cria outro
+        with self._trava:
+            for chave, (nome_da_entrada, _) in list(self._entradas.items()):
+                if nome_da_entrada == nome:
+                    del self._entradas[chave]
+
+    def estatisticas(self) -> dict:
+        with self._trava:
+            return {"entradas": len(self._entradas), **self._contadores}
+
+    async def _obter_nome(self, modelo: str, instrucoes: str, criar_cache):
+        chave = hashlib.sha1(f"{modelo}\n{instrucoes}".encode("utf-8")).hexdigest()
+        with self._trava:
+            entrada = self._entradas.get(chave)
+            if entrada is not None and time.time() < entrada[1]:
+                self._entradas.move_to_end(chave)
+                if entrada[0] is not None:
+                    self._contadores["reutilizados"] += 1
+                return entrada[0]
+        # Rodadas simultâneas da mesma prova e matéria esperam a mesma criação
+        criacao = self._criando.get(chave)
+        if criacao is None:
+            criacao = self._criando[chave] = asyncio.ensure_future(self._criar(chave, modelo, instrucoes, criar_cache))
+            criacao.add_done_callback(lambda _: self._criando.pop(chave, None))
+        return await asyncio.shield(criacao)
+
+    async def _criar(self, chave: str, modelo: str, instrucoes: str, criar_cache):
+        try:
+            nome = await criar_cache(modelo, instrucoes, self.ttl_segundos)
+            expira_em = time.time() + self.ttl_segundos - MARGEM_EXPIRACAO_SEGUNDOS
+        except Exception as e_cache:
+            logger.warning("Falha ao criar o cache de contexto: %s", e_cache)
+            nome, expira_em = None, time.time() + self.ttl_segundos
+        with self._trava:
+            self._contadores["criados" if nome is not None else "falhas"] += 1
+            self._entradas[chave] = (nome, expira_em)
+            self._entradas.move_to_end(chave)
+            while len(self._entradas) > self.max_entradas:
+                self._entradas.popitem(last=False)
+        return nome
+
+
+_trava = threading.Lock()
+_cache_de_contexto = None
+
+def obter_cache_de_contexto() -> CacheDeContexto:
+    global _cache_de_contexto
+    with _trava:
+        if _cache_de_contexto is None:
+            _cache_de_contexto = CacheDeContexto()
+        return _cache_de_contexto
+
+async def aplicar_cache_de_contexto(llm_request, criar_cache):
+    if not ATIVO:
+        return llm_request
+    return await obter_cache_de_contexto().aplicar(llm_request, criar_cache)
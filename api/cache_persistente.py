@@ -0,0 +1,178 @@
+import os
+import asyncio
+import sqlite3
+import time
+import logging
+import unicodedata
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+# --- Configuração do Cache ---
+# O arquivo SQLite é compartilhado por todos os workers do Streamlit no mesmo host/container.
+# Em produção, aponte ASSISTENTE_CACHE_DB para um volume persistente para sobreviver a reinícios.
+CAMINHO_CACHE_PADRAO = os.getenv(
+    "ASSISTENTE_CACHE_DB",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "assistente.sqlite3"),
+)
+
+
+def normalizar_chave(*partes: str) -> str:
+    # "ENEM", " enem " e "Énem" devem cair na mesma entrada do cache
+    normalizadas = []
+    for parte in partes:
+        texto = unicodedata.normalize("NFKD", str(parte))
+        texto = "".join(c for c in texto if not unicodedata.combining(c))
+        normalizadas.append(" ".join(texto.casefold().split()))
+    return "|".join(normalizadas)
+
+
+class CachePersistente:
+    """Cache chave/valor em SQLite com expiração (TTL) e limite de tamanho (LRU).
+
+    `obter_ou_calcular` também agrupa pedidos simultâneos (single-flight): enquanto o valor de uma
+    chave está sendo calculado, os demais pedidos aguardam o mesmo resultado em vez de repetir a chamada.
+    """
+
+    def __init__(self, namespace: str, ttl_segundos: float, max_itens: int, caminho: str = CAMINHO_CACHE_PADRAO):
+        self.namespace = namespace
+        self.ttl_segundos = ttl_segundos
+        self.max_itens = max_itens
+        self.caminho = caminho
+        self._em_andamento = {} # chave -> tarefa calculando o valor (no loop compartilhado dos agentes)
+        self.pedidos_agrupados = 0
+
+        pasta = os.path.dirname(self.caminho)
+        if pasta:
+            os.makedirs(pasta, exist_ok=True)
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache (
+                    namespace TEXT NOT NULL,
+                    chave TEXT NOT NULL,
+                    valor TEXT NOT NULL,
+                    criado_em REAL NOT NULL,
+                    ultimo_acesso REAL NOT NULL,
+                    PRIMARY KEY (namespace, chave)
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_cache_lru ON cache (namespace, ultimo_acesso)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS cache_estatisticas (
+                    namespace TEXT PRIMARY KEY,
+                    acertos INTEGER NOT NULL DEFAULT 0,
+                    falhas INTEGER NOT NULL DEFAULT 0,
+                    expirados INTEGER NOT NULL DEFAULT 0,
+                    despejados INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("INSERT OR IGNORE INTO cache_estatisticas (namespace) VALUES (?)", (self.namespace,))
+
+    def _conectar(self) -> sqlite3.Connection:
+        # Uma conexão por operação: o Streamlit atende cada sessão em uma thread diferente
+        return sqlite3.connect(self.caminho, timeout=10)
+
+    def _incrementar(self, conn: sqlite3.Connection, **contadores: int):
+        atribuicoes = ", ".join(f"{nome} = {nome} + ?" for nome in contadores)
+        conn.execute(
+            f"UPDATE cache_estatisticas SET {atribuicoes} WHERE namespace = ?",
+            (*contadores.values(), self.namespace),
+        )
+
+    def obter(self, chave: str):
+        agora = time.time()
+        try:
+            with closing(self._conectar()) as conn, conn:
+                linha = conn.execute(
+                    "SELECT valor, criado_em FROM cache WHERE namespace = ? AND chave = ?",
+                    (self.namespace, chave),
+                ).fetchone()
+                if linha is None:
+                    self._incrementar(conn, falhas=1)
+                    return None
+                valor, criado_em = linha
+                if agora - criado_em > self.ttl_segundos:
+                    conn.execute("DELETE FROM cache WHERE namespace = ? AND chave = ?", (self.namespace, chave))
+                    self._incrementar(conn, falhas=1, expirados=1)
+                    return None
+                conn.execute(
+                    "UPDATE cache SET ultimo_acesso = ? WHERE namespace = ? AND chave = ?",
+                    (agora, self.namespace, chave),
+                )
+                self._incrementar(conn, acertos=1)
+                return valor
+        except sqlite3.Error as e_cache:
+            # Falha no cache nunca deve derrubar o fluxo de estudos: tratamos como miss
+            logger.warning("Falha ao ler o cache '%s': %s", self.namespace, e_cache)
+            return None
+
+    def salvar(self, chave: str, valor: str):
+        agora = time.time()
+        try:
+            with closing(self._conectar()) as conn, conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO cache (namespace, chave, valor, criado_em, ultimo_acesso) VALUES (?, ?, ?, ?, ?)",
+                    (self.namespace, chave, valor, agora, agora),
+                )
+                # Despeja as entradas menos usadas recentemente além do limite
+                cursor = conn.execute(
+                    """
+                    DELETE FROM cache WHERE namespace = ? AND chave IN (
+                        SELECT chave FROM cache WHERE namespace = ?
+                        ORDER BY ultimo_acesso DESC LIMIT -1 OFFSET ?
+                    )
+                    """,
+                    (self.namespace, self.namespace, self.max_itens),
+                )
+                if cursor.rowcount > 0:
+                    self._incrementar(conn, despejados=cursor.rowcount)
+        except sqlite3.Error as e_cache:
+            logger.warning("Falha ao gravar no cache '%s': %s", self.namespace, e_cache)
+
+    async def obter_ou_calcular(self, chave: str, calcular, deve_guardar=lambda valor: True):
+        # O SQLite bloqueia (até `timeout` segundos se outro worker segura a trava do arquivo):
+        # roda numa thread auxiliar para não parar o loop compartilhado, e com ele todos os agentes
+        valor = await asyncio.to_thread(self.obter, chave)
+        if valor is not None:
+            return valor
+
+        tarefa = self._em_andamento.get(chave)
+        if tarefa is None:
+            async def _calcular_e_guardar():
+                valor_calculado = await calcular()
+                if deve_guardar(valor_calculado):
+                    await asyncio.to_thread(self.salvar, chave, valor_calculado)
+                return valor_calculado
+
+            tarefa = asyncio.ensure_future(_calcular_e_guardar())
+            self._em_andamento[chave] = tarefa
+            tarefa.add_done_callback(lambda _: self._em_andamento.pop(chave, None))
+        else:
+            self.pedidos_agrupados += 1
+        # shield: se um dos interessados desistir, a chamada continua para os demais
+        return await asyncio.shield(tarefa)
+
+    def limpar(self):
+        with closing(self._conectar()) as conn, conn:
+            conn.execute("DELETE FROM cache WHERE namespace = ?", (self.namespace,))
+
+    def estatisticas(self) -> dict:
+        with closing(self._conectar()) as conn:
+            acertos, falhas, expirados, despejados = conn.execute(
+                "SELECT acertos, falhas, expirados, despejados FROM cache_estatisticas WHERE namespace = ?",
+                (self.namespace,),
+            ).fetchone()
+            (itens,) = conn.execute("SELECT COUNT(*) FROM cache WHERE namespace = ?", (self.namespace,)).fetchone()
+        consultas = acertos + falhas
+        return {
+            "itens": itens,
+            "max_itens": self.max_itens,
+            "ttl_segundos": self.ttl_segundos,
+            "acertos": acertos,
+            "falhas": falhas,
+            "expirados": expirados,
+            "despejados": despejados,
+            "pedidos_agrupados": self.pedidos_agrupados,
+            "taxa_de_acerto": acertos / consultas if consultas else 0.0,
+        }
@@ -0,0 +1,38 @@
+from typing import NamedTuple
+
+from questoes import extrair_letra
+
+# --- Correção Local (gabarito) ---
+# Questões de múltipla escolha são conferidas aqui mesmo contra o gabarito gerado junto com a
+# questão. Só o que precisa de explicação (erros, em branco e discursivas) vai para o agente_professor2,
+# assim como as questões cujo gabarito não é uma letra válida, que não dá para conferir aqui.
+class CorrecaoLocal(NamedTuple):
+    corretas: tuple
+    pendentes: tuple
+    total_objetivas: int
+
+
+def corrigir_localmente(questoes, respostas: dict) -> CorrecaoLocal:
+    corretas = []
+    pendentes = []
+    total_objetivas = 0
+    for questao in questoes:
+        gabarito = extrair_letra(questao.gabarito, questao.letras()) if questao.multipla_escolha else ""
+        if not gabarito:
+            pendentes.append(questao)
+            continue
+        total_objetivas += 1
+        # Aceita "b", "B", "b)", "b) texto da alternativa" ou "alternativa b"
+        if extrair_letra(respostas.get(questao.id, ""), questao.letras()) == gabarito:
+            corretas.append(questao)
+        else:
+            pendentes.append(questao)
+    return CorrecaoLocal(tuple(corretas), tuple(pendentes), total_objetivas)
+
+def resumo_da_correcao_local(correcao: CorrecaoLocal) -> str:
+    if not correcao.total_objetivas:
+        return ""
+    linhas = [f"**Múltipla escolha: {len(correcao.corretas)} de {correcao.total_objetivas} corretas.**", ""]
+    for questao in correcao.corretas:
+        linhas.append(f"- ✅ Questão {questao.id}: `Correta` (alternativa {questao.gabarito}). {questao.referencia_resolucao}")
+    return "\n".join(linhas)
@@ -0,0 +1,120 @@
+import os
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from cache_persistente import normalizar_chave
+
+# --- Detecção de Questões Repetidas ---
+# Cada questão vira uma assinatura MinHash dos trechos de 5 caracteres do texto normalizado
+# (tópico, enunciado e alternativas): a fração de posições iguais entre duas assinaturas estima a
+# similaridade de Jaccard entre os textos. Trocar um número ou reordenar uma frase mantém a
+# similaridade alta; questões diferentes ficam perto de zero.
+#
+# O histórico de cada aluno (por prova e matéria) é uma matriz de assinaturas em buffer circular:
+# um lote novo é comparado com tudo o que já foi visto numa única operação vetorizada, e só as
+# ASSISTENTE_DUPLICATAS_CAPACIDADE questões mais recentes são guardadas (128 bytes cada).
+
+TAMANHO_TRECHO = 5
+NUM_PERMUTACOES = 64
+LIMIAR_PADRAO = float(os.getenv("ASSISTENTE_DUPLICATAS_LIMIAR", 0.5))
+CAPACIDADE_PADRAO = int(os.getenv("ASSISTENTE_DUPLICATAS_CAPACIDADE", 2000))
+MAX_INDICES = int(os.getenv("ASSISTENTE_DUPLICATAS_MAX_INDICES", 1000))
+
+# Famílias de hash multiply-shift fixas: as assinaturas valem entre execuções e entre processos
+_gerador = np.random.default_rng(20250518)
+_MULTIPLICADORES = _gerador.integers(1, 2**63, size=NUM_PERMUTACOES, dtype=np.uint64) * np.uint64(2) + np.uint64(1)
+_DESLOCAMENTOS = _gerador.integers(0, 2**63, size=NUM_PERMUTACOES, dtype=np.uint64)
+_POTENCIAS = np.uint64(257) ** np.arange(TAMANHO_TRECHO - 1, -1, -1, dtype=np.uint64)
+
+
+def texto_da_questao(questao) -> str:
+    return normalizar_chave(questao.topico, questao.enunciado, *questao.alternativas)
+
+def _hashes_dos_trechos(texto: str) -> np.ndarray:
+    dados = np.frombuffer(texto.encode("utf-8"), dtype=np.uint8).astype(np.uint64)
+    if len(dados) < TAMANHO_TRECHO:
+        dados = np.pad(dados, (0, TAMANHO_TRECHO - len(dados)))
+    return np.unique(sliding_window_view(dados, TAMANHO_TRECHO) @ _POTENCIAS)
+
+def assinaturas(textos) -> np.ndarray:
+    # Uma linha por texto; os 16 bits mais altos de cada mínimo bastam para comparar igualdade
+    resultado = np.empty((len(textos), NUM_PERMUTACOES), dtype=np.uint16)
+    for linha, texto in enumerate(textos):
+        hashes = _hashes_dos_trechos(texto)
+        misturados = _MULTIPLICADORES[:, None] * hashes[None, :] + _DESLOCAMENTOS[:, None] # Estoura em 64 bits, de propósito
+        resultado[linha] = misturados.min(axis=1) >> np.uint64(48)
+    return resultado
+
+def similaridade(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    # Jaccard estimado entre cada linha de `a` e cada linha de `b`: matriz (len(a), len(b))
+    return (a[:, None, :] == b[None, :, :]).mean(axis=2)
+
+
+class IndiceDeQuestoes:
+    """Assinaturas das questões já vistas por um aluno, em buffer circular de tamanho limitado."""
+
+    def __init__(self, capacidade: int = CAPACIDADE_PADRAO):
+        self.capacidade = capacidade
+        self._assinaturas = np.empty((min(capacidade, 64), NUM_PERMUTACOES), dtype=np.uint16) # Cresce sob demanda
+        self._total = 0
+        self._trava = threading.Lock()
+
+    def __len__(self):
+        return min(self._total, self.capacidade)
+
+    def _adicionar(self, novas: np.ndarray):
+        for assinatura in novas:
+            if self._total < self.capacidade and self._total == len(self._assinaturas):
+                maior = np.empty((min(2 * len(self._assinaturas), self.capacidade), NUM_PERMUTACOES), dtype=np.uint16)
+                maior[:self._total] = self._assinaturas
+                self._assinaturas = maior
+            self._assinaturas[self._total % self.capacidade] = assinatura
+            self._total += 1
+
+    def filtrar_novas(self, questoes, limiar: float = LIMIAR_PADRAO, maximo: int = None):
+        # Devolve (novas, repetidas) e guarda as novas no índice. Também conta como repetida a
+        # questão parecida com outra, anterior, do mesmo lote. Com `maximo`, só as primeiras
+        # `maximo` novas são aceitas (e guardadas); as demais são simplesmente descartadas.
+        if not questoes:
+            return (), ()
+        do_lote = assinaturas([texto_da_questao(q) for q in questoes])
+        with self._trava:
+            maxima = np.zeros(len(questoes))
+            if len(self):
+                maxima = similaridade(do_lote, self._assinaturas[:len(self)]).max(axis=1)
+            no_lote = np.triu(similaridade(do_lote, do_lote), k=1) # [i, j] com i < j
+            repetida = (maxima >= limiar) | (no_lote >= limiar).any(axis=0)
+            aceita = ~repetida
+            if maximo is not None:
+                aceita &= np.cumsum(aceita) <= maximo
+            self._adicionar(do_lote[aceita])
+        novas = tuple(q for q, a in zip(questoes, aceita) if a)
+        repetidas = tuple(q for q, r in zip(questoes, repetida) if r)
+        return novas, repetidas
+
+
+class RegistroDeIndices:
+    """Um IndiceDeQuestoes por chave, com no máximo `max_indices` em memória (LRU)."""
+
+    def __init__(self, max_indices: int = MAX_INDICES, capacidade: int = CAPACIDADE_PADRAO):
+        self.max_indices = max_indices
+        self.capacidade = capacidade
+        self._indices = OrderedDict()
+        self._trava = threading.Lock()
+
+    def obter(self, chave) -> IndiceDeQuestoes:
+        with self._trava:
+            indice = self._indices.get(chave)
+            if indice is None:
+                indice = self._indices[chave] = IndiceDeQuestoes(self.capacidade)
+                while len(self._indices) > self.max_indices:
+                    self._indices.popitem(last=False)
+            self._indices.move_to_end(chave)
+            return indice
+
+    def remover(self, chave):
+        with self._trava:
+            self._indices.pop(chave, None)
@@ -0,0 +1,25 @@
+import os
+import sys
+import logging
+
+from aquecimento import AQUECIMENTO_ATIVO, aquecer
+
+# --- Inicialização do Container ---
+# Substitui `streamlit run api/streamlit_app.py`: aquece o processo (ver aquecimento.py) e só então
+# sobe o servidor do Streamlit, no mesmo processo, de modo que módulos, agentes e clientes já
+# estejam prontos quando a primeira sessão chegar. Argumentos extras vão para o `streamlit run`.
+#
+# Uso: python api/iniciar.py --server.port=8501 --server.address=0.0.0.0
+
+CAMINHO_APP = os.path.join(os.path.dirname(os.path.abspath(__file__)), "streamlit_app.py")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    logging.getLogger("aquecimento").setLevel(logging.INFO) # O ADK é verboso demais em INFO
+    if AQUECIMENTO_ATIVO:
+        aquecer()
+
+    from streamlit.web import cli as stcli
+
+    sys.argv = ["streamlit", "run", CAMINHO_APP, *sys.argv[1:]]
+    sys.exit(stcli.main())
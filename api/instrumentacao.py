@@ -0,0 +1,217 @@
+import os
+import sys
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from opentelemetry import trace
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import SpanProcessor, TracerProvider
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+from opentelemetry.trace import Status, StatusCode
+
+# --- Instrumentação das Chamadas aos Agentes ---
+# Cada execução de agente vira um span "agente" (OpenTelemetry) com a duração total, o tempo até o
+# primeiro evento, os tokens informados pelo Gemini (usage_metadata), as chamadas de ferramentas e a
+# classe do erro, se houver. O `AgregadorDeLatencias` guarda as últimas medições por agente para o
+# painel de administração, com as chamadas em segundo plano (reabastecimento do banco de questões)
+# em linhas à parte; os spans também podem ser exportados para o console ou um arquivo definindo
+# ASSISTENTE_TRACES ("console" ou o caminho do arquivo).
+
+NOME_SPAN_AGENTE = "agente"
+AMOSTRAS_POR_AGENTE = int(os.getenv("ASSISTENTE_TRACES_AMOSTRAS", 1000))
+
+# Medição em andamento na tarefa atual; é por ela que o cliente do Gemini informa os tokens usados
+_medicao_atual: ContextVar = ContextVar("medicao_atual", default=None)
+
+
+def percentil(valores_ordenados: list, p: float) -> float:
+    if not valores_ordenados:
+        return 0.0
+    return valores_ordenados[min(len(valores_ordenados) - 1, round(p / 100 * (len(valores_ordenados) - 1)))]
+
+
+class AgregadorDeLatencias(SpanProcessor):
+    """Recebe os spans "agente" encerrados e mantém as últimas medições de cada agente."""
+
+    def __init__(self, amostras_por_agente: int = AMOSTRAS_POR_AGENTE):
+        self.amostras_por_agente = amostras_por_agente
+        self._trava = threading.Lock() # Spans terminam no loop dos agentes e são lidos na thread do Streamlit
+        self._duracoes = {}
+        self._primeiros_eventos = {}
+        self._contadores = {}
+
+    def on_end(self, span):
+        if span.name != NOME_SPAN_AGENTE:
+            return
+        atributos = span.attributes or {}
+        nome = atributos.get("agente.nome", "desconhecido")
+        segundo_plano = bool(atributos.get("segundo_plano"))
+        if segundo_plano:
+            nome = f"{nome} (segundo plano)"
+        with self._trava:
+            if nome not in self._duracoes:
+                self._duracoes[nome] = deque(maxlen=self.amostras_por_agente)
+                self._primeiros_eventos[nome] = deque(maxlen=self.amostras_por_agente)
+                self._contadores[nome] = {
+                    "segundo_plano": segundo_plano,
+                    "chamadas": 0, "erros": 0, "tokens_entrada": 0, "tokens_em_cache": 0, "tokens_saida": 0,
+                    "chamadas_ferramentas": 0,
+                }
+            self._duracoes[nome].append((span.end_time - span.start_time) / 1e9)
+            if "agente.primeiro_evento_s" in atributos:
+                self._primeiros_eventos[nome].append(atributos["agente.primeiro_evento_s"])
+            contadores = self._contadores[nome]
+            contadores["chamadas"] += 1
+            contadores["erros"] += 1 if "erro.classe" in atributos else 0
+            contadores["tokens_entrada"] += atributos.get("gen_ai.usage.input_tokens", 0)
+            contadores["tokens_em_cache"] += atributos.get("gen_ai.usage.cached_tokens", 0)
+            contadores["tokens_saida"] += atributos.get("gen_ai.usage.output_tokens", 0)
+            contadores["chamadas_ferramentas"] += atributos.get("agente.chamadas_ferramentas", 0)
+
+    def estatisticas(self) -> dict:
+        resultado = {}
+        with self._trava:
+            for nome, duracoes in self._duracoes.items():
+                duracoes = sorted(duracoes)
+                primeiros_eventos = sorted(self._primeiros_eventos[nome])
+                resultado[nome] = {
+                    "p50_s": percentil(duracoes, 50),
+                    "p95_s": percentil(duracoes, 95),
+                    "p99_s": percentil(duracoes, 99),
+                    "primeiro_evento_p50_s": percentil(primeiros_eventos, 50),
+                    "primeiro_evento_p95_s": percentil(primeiros_eventos, 95),
+                    **self._contadores[nome],
+                }
+        return resultado
+
+    def limpar(self):
+        with self._trava:
+            self._duracoes.clear()
+            self._primeiros_eventos.clear()
+            self._contadores.clear()
+
+
+class MedicaoDeAgente:
+    def __init__(self, span):
+        self.span = span
+        self.inicio = time.perf_counter()
+        self.primeiro_evento_s = None
+        self.tokens_entrada = 0
+        self.tokens_em_cache = 0
+        self.tokens_saida = 0
+        self.tokens_total = 0
+        self.chamadas_ferramentas = 0
+        self.buscas_web = set()
+        self.classe_erro = None
+
+    def registrar_evento(self, event):
+        if self.primeiro_evento_s is None:
+            self.primeiro_evento_s = time.perf_counter() - self.inicio
+        self.chamadas_ferramentas += len(event.get_function_calls())
+        # O google_search roda no lado do Gemini e não gera function calls: cada consulta feita
+        # aparece no grounding_metadata (contada uma vez, mesmo que venha em mais de um trecho)
+        if event.grounding_metadata and event.grounding_metadata.web_search_queries:
+            self.buscas_web.update(event.grounding_metadata.web_search_queries)
+        if event.error_code and self.classe_erro is None:
+            self.classe_erro = str(event.error_code)
+
+    def registrar_uso(self, uso):
+        # `uso` é o usage_metadata de uma resposta completa do Gemini
+        self.tokens_entrada += uso.prompt_token_count or 0
+        self.tokens_em_cache += uso.cached_content_token_count or 0 # Parte da entrada atendida pelo cache de contexto
+        self.tokens_saida += uso.candidates_token_count or 0
+        self.tokens_total += uso.total_token_count or 0
+
+    def registrar_erro(self, erro: BaseException):
+        self.classe_erro = type(erro).__name__
+        self.span.record_exception(erro)
+
+    def _finalizar(self):
+        atributos = {
+            "gen_ai.usage.input_tokens": self.tokens_entrada,
+            "gen_ai.usage.cached_tokens": self.tokens_em_cache,
+            "gen_ai.usage.output_tokens": self.tokens_saida,
+            "gen_ai.usage.total_tokens": self.tokens_total,
+            "agente.chamadas_ferramentas": self.chamadas_ferramentas + len(self.buscas_web),
+        }
+        if self.primeiro_evento_s is not None:
+            atributos["agente.primeiro_evento_s"] = self.primeiro_evento_s
+        if self.classe_erro is not None:
+            atributos["erro.classe"] = self.classe_erro
+            self.span.set_status(Status(StatusCode.ERROR, self.classe_erro))
+        self.span.set_attributes(atributos)
+
+
+def _configurar_telemetria():
+    agregador = AgregadorDeLatencias()
+    provedor = trace.get_tracer_provider()
+    if not isinstance(provedor, TracerProvider):
+        # Ninguém configurou o OpenTelemetry neste processo: registramos o nosso provedor
+        provedor = TracerProvider(resource=Resource.create({"service.name": "assistente-de-estudos-ia"}))
+        destino = os.getenv("ASSISTENTE_TRACES")
+        if destino:
+            saida = sys.stdout if destino == "console" else open(destino, "a", encoding="utf-8")
+            provedor.add_span_processor(BatchSpanProcessor(ConsoleSpanExporter(out=saida)))
+        trace.set_tracer_provider(provedor)
+    provedor.add_span_processor(agregador)
+    return provedor.get_tracer("assistente_estudos"), agregador
+
+_tracer, agregador = _configurar_telemetria()
+
+
+@contextmanager
+def medir_agente(nome_agente: str, **atributos):
+    with _tracer.start_as_current_span(
+        NOME_SPAN_AGENTE, attributes={"agente.nome": nome_agente, **atributos},
+        record_exception=False, set_status_on_exception=False,
+    ) as span:
+        medicao = MedicaoDeAgente(span)
+        token = _medicao_atual.set(medicao)
+        try:
+            yield medicao
+        except Exception as e_medido:
+            medicao.registrar_erro(e_medido)
+            raise
+        finally:
+            _medicao_atual.reset(token)
+            medicao._finalizar()
+
+
+def registrar_uso_de_tokens(uso):
+    medicao = _medicao_atual.get()
+    if medicao is not None and uso is not None:
+        medicao.registrar_uso(uso)
+
+
+def instrumentar_cliente_genai(cliente):
+    # O ADK descarta o usage_metadata das respostas; interceptamos as chamadas do cliente assíncrono
+    # do google.genai para somar os tokens na medição em andamento.
+    modelos = cliente.aio.models
+    gerar_original = modelos.generate_content
+    gerar_stream_original = modelos.generate_content_stream
+
+    async def generate_content(*args, **kwargs):
+        resposta = await gerar_original(*args, **kwargs)
+        registrar_uso_de_tokens(resposta.usage_metadata)
+        return resposta
+
+    async def generate_content_stream(*args, **kwargs):
+        respostas = await gerar_stream_original(*args, **kwargs)
+
+        async def _repassar():
+            ultimo_uso = None
+            async for resposta in respostas:
+                # Em streaming cada pedaço traz o acumulado: vale o último
+                if resposta.usage_metadata:
+                    ultimo_uso = resposta.usage_metadata
+                yield resposta
+            registrar_uso_de_tokens(ultimo_uso)
+
+        return _repassar()
+
+    modelos.generate_content = generate_content
+    modelos.generate_content_stream = generate_content_stream
+    return cliente
@@ -0,0 +1,123 @@
+import os
+import json
+import random
+import asyncio
+import hashlib
+
+from google.adk.models import BaseLlm
+from google.adk.models.llm_response import LlmResponse
+from google.genai import types
+
+from cache_de_contexto import aplicar_cache_de_contexto
+from instrumentacao import registrar_uso_de_tokens
+
+# --- Modelo Simulado (sem Gemini) ---
+# Substitui o Gemini por respostas locais e determinísticas, com latência e tamanho configuráveis.
+# Usado pelo benchmark (benchmark.py) e para rodar o app sem gastar cota: ASSISTENTE_MODELO_SIMULADO=1.
+# Fica abaixo do `ModeloAgendado`, então fila justa, caches e instrumentação continuam valendo.
+# O google_search é uma ferramenta interna do Gemini (a busca acontece no servidor); aqui ela vira
+# uma latência extra nas requisições que a declaram e consultas fictícias no grounding_metadata,
+# como o Gemini informa as buscas que fez. O cache de contexto (cache_de_contexto.py) também vale:
+# as instruções ficam guardadas em memória, e a parte em cache é informada como no Gemini.
+
+_caches_de_contexto = {} # nome -> instruções de sistema
+_repeticoes = {} # hash da entrada -> quantas vezes foi pedida
+
+
+def _config(nome: str, padrao: float) -> float:
+    return float(os.getenv(f"ASSISTENTE_SIMULADO_{nome}", padrao))
+
+
+class ModeloSimulado(BaseLlm):
+    """BaseLlm local que responde a cada agente no formato que ele produziria."""
+
+    latencia_segundos: float = _config("LATENCIA_SEGUNDOS", 0.5)
+    latencia_busca_segundos: float = _config("LATENCIA_BUSCA_SEGUNDOS", 1.0)
+    intervalo_streaming_segundos: float = _config("INTERVALO_STREAMING_SEGUNDOS", 0.02)
+    variacao: float = _config("VARIACAO", 0.2) # Fração aleatória (determinística) somada à latência
+    palavras_por_resposta: int = int(_config("PALAVRAS", 300))
+    questoes_por_lote: int = int(_config("QUESTOES", 15))
+    palavras_por_pedaco: int = 8
+
+    async def generate_content_async(self, llm_request, stream: bool = False):
+        llm_request = await aplicar_cache_de_contexto(llm_request, self._criar_cache_de_contexto)
+        texto_pedido = "\n".join(
+            part.text for content in llm_request.contents for part in (content.parts or []) if part.text
+        )
+        config = llm_request.config
+        instrucoes_em_cache = _caches_de_contexto.get(config.cached_content, "") if config and config.cached_content else ""
+        instrucoes = instrucoes_em_cache or (str(config.system_instruction or "") if config else "")
+        # Respostas e latências determinísticas, para execuções do benchmark serem comparáveis. Como
+        # no Gemini (com temperatura), repetir um pedido não devolve o mesmo texto: a semente inclui
+        # quantas vezes essa entrada já foi pedida.
+        entrada = hashlib.sha1((instrucoes + texto_pedido).encode("utf-8")).digest()
+        _repeticoes[entrada] = _repeticoes.get(entrada, 0) + 1
+        semente = int.from_bytes(hashlib.sha1(entrada + _repeticoes[entrada].to_bytes(4, "big")).digest()[:8], "big")
+        aleatorio = random.Random(semente)
+
+        usa_busca = bool(config and config.tools and any(ferramenta.google_search for ferramenta in config.tools))
+        if config and config.response_schema is not None:
+            texto = self._questoes(aleatorio)
+        elif usa_busca:
+            texto = self._texto(aleatorio, "Tópico" if "Matéria:" in texto_pedido else "Estilo")
+        else:
+            texto = self._texto(aleatorio, "Correção")
+
+        latencia = self.latencia_segundos + (self.latencia_busca_segundos if usa_busca else 0.0)
+        await asyncio.sleep(latencia * (1 + self.variacao * aleatorio.random()))
+
+        if stream:
+            palavras = texto.split(" ")
+            for inicio in range(0, len(palavras), self.palavras_por_pedaco):
+                yield LlmResponse(
+                    content=types.Content(role="model", parts=[types.Part(text=" ".join(palavras[inicio:inicio + self.palavras_por_pedaco]) + " ")]),
+                    partial=True,
+                )
+                await asyncio.sleep(self.intervalo_streaming_segundos)
+
+        # Estimativa grosseira de ~4 caracteres por token, só para o painel de tokens fazer sentido;
+        # como no Gemini, as instruções de sistema contam como entrada
+        caracteres_entrada = len(texto_pedido) + len(instrucoes)
+        registrar_uso_de_tokens(types.GenerateContentResponseUsageMetadata(
+            prompt_token_count=caracteres_entrada // 4,
+            cached_content_token_count=len(instrucoes_em_cache) // 4,
+            candidates_token_count=len(texto) // 4,
+            total_token_count=(caracteres_entrada + len(texto)) // 4,
+        ))
+        yield LlmResponse(
+            content=types.Content(role="model", parts=[types.Part(text=texto)]),
+            grounding_metadata=types.GroundingMetadata(
+                web_search_queries=[f"consulta {numero}" for numero in range(1, aleatorio.randint(1, 3) + 1)]
+            ) if usa_busca else None,
+        )
+
+    async def _criar_cache_de_contexto(self, modelo: str, instrucoes: str, ttl_segundos: float) -> str:
+        nome = f"cachedContents/simulado-{hashlib.sha1(instrucoes.encode('utf-8')).hexdigest()[:16]}"
+        _caches_de_contexto[nome] = instrucoes
+        return nome
+
+    def _texto(self, aleatorio: random.Random, rotulo: str) -> str:
+        linhas = []
+        palavras_restantes = self.palavras_por_resposta
+        numero = 1
+        while palavras_restantes > 0:
+            tamanho = min(palavras_restantes, aleatorio.randint(8, 20))
+            linhas.append(f"{numero}. {rotulo} {numero}: " + " ".join(f"termo{aleatorio.randint(1, 999)}" for _ in range(tamanho)))
+            palavras_restantes -= tamanho
+            numero += 1
+        return "\n".join(linhas)
+
+    def _questoes(self, aleatorio: random.Random) -> str:
+        questoes = []
+        for numero in range(1, self.questoes_por_lote + 1):
+            multipla_escolha = numero % 3 != 0 # Uma discursiva a cada três
+            a, b = aleatorio.randint(1, 99), aleatorio.randint(1, 99)
+            questoes.append({
+                "id": numero,
+                "topico": f"Tópico {(numero - 1) // 3 + 1}",
+                "enunciado": f"Quanto é {a} + {b}?",
+                "alternativas": [str(a + b + desvio) for desvio in (-1, 0, 1, 2, 3)] if multipla_escolha else [],
+                "gabarito": "b" if multipla_escolha else str(a + b),
+                "referencia_resolucao": "Soma de dois números inteiros.",
+            })
+        return json.dumps({"questoes": questoes}, ensure_ascii=False)
@@ -0,0 +1,96 @@
+import os
+import re
+import sys
+import json
+import argparse
+import subprocess
+
+# --- Perfil de Importação ---
+# Mede, em processos novos, quanto tempo leva para importar cada módulo do app (python -X importtime)
+# e quanto leva o aquecimento completo, agrupando o tempo pelos pacotes responsáveis. Serve para
+# acompanhar o tempo de inicialização entre versões: grave o resultado com --json e compare.
+#
+# Uso: python api/perfil_importacao.py --json perfil.json
+
+PASTA_API = os.path.dirname(os.path.abspath(__file__))
+MODULOS_PADRAO = ["streamlit", "questoes", "instrumentacao", "agentes", "servico", "api_http"]
+_LINHA_IMPORTTIME = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)")
+
+
+def _argumentos():
+    parser = argparse.ArgumentParser(description="Perfil do tempo de importação e de aquecimento do app.")
+    parser.add_argument("--modulos", nargs="+", default=MODULOS_PADRAO, help="Módulos a importar, cada um em um processo novo.")
+    parser.add_argument("--top", type=int, default=10, help="Quantos pacotes mais lentos mostrar por módulo.")
+    parser.add_argument("--sem-aquecimento", action="store_true", help="Não mede o aquecimento completo.")
+    parser.add_argument("--json", default=None, help="Grava o relatório neste arquivo.")
+    return parser.parse_args()
+
+
+def _executar(codigo: str, *opcoes: str) -> subprocess.CompletedProcess:
+    ambiente = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, [PASTA_API, os.getenv("PYTHONPATH")]))}
+    return subprocess.run([sys.executable, *opcoes, "-c", codigo], cwd=PASTA_API, env=ambiente, capture_output=True, text=True)
+
+
+def _pacote_raiz(nome: str) -> str:
+    # google.* são pacotes independentes (google.adk, google.genai, google.cloud...)
+    partes = nome.split(".")
+    return ".".join(partes[:2]) if partes[0] == "google" and len(partes) > 1 else partes[0]
+
+
+def perfil_do_modulo(modulo: str, top: int) -> dict:
+    processo = _executar(f"import {modulo}", "-X", "importtime")
+    if processo.returncode != 0:
+        return {"erro": processo.stderr.strip().splitlines()[-1] if processo.stderr.strip() else "falhou"}
+    total_us = 0
+    por_pacote = {}
+    for linha in processo.stderr.splitlines():
+        encontrado = _LINHA_IMPORTTIME.match(linha)
+        if not encontrado:
+            continue
+        proprio_us, acumulado_us, recuo, nome = int(encontrado[1]), int(encontrado[2]), encontrado[3], encontrado[4]
+        if len(recuo) == 1: # Importações de primeiro nível: a soma delas é o tempo total
+            total_us += acumulado_us
+        por_pacote[_pacote_raiz(nome)] = por_pacote.get(_pacote_raiz(nome), 0) + proprio_us
+    mais_lentos = sorted(por_pacote.items(), key=lambda item: item[1], reverse=True)[:top]
+    return {
+        "total_s": total_us / 1e6,
+        "modulos_importados": sum(1 for linha in processo.stderr.splitlines() if _LINHA_IMPORTTIME.match(linha)),
+        "pacotes_mais_lentos": {pacote: tempo_us / 1e6 for pacote, tempo_us in mais_lentos},
+    }
+
+
+def perfil_do_aquecimento() -> dict:
+    processo = _executar("import json; from aquecimento import aquecer; print(json.dumps(aquecer()))")
+    if processo.returncode != 0 or not processo.stdout.strip():
+        return {"erro": processo.stderr.strip().splitlines()[-1] if processo.stderr.strip() else "falhou"}
+    return json.loads(processo.stdout.strip().splitlines()[-1])
+
+
+def imprimir_relatorio(relatorio: dict):
+    for modulo, perfil in relatorio["modulos"].items():
+        if "erro" in perfil:
+            print(f"\n{modulo}: ERRO {perfil['erro']}")
+            continue
+        print(f"\n{modulo}: {perfil['total_s']:.2f}s ({perfil['modulos_importados']} módulos)")
+        for pacote, segundos in perfil["pacotes_mais_lentos"].items():
+            print(f"    {pacote:<40}{segundos:>8.3f}s")
+    aquecimento = relatorio.get("aquecimento")
+    if aquecimento:
+        print("\naquecimento:" if "erro" not in aquecimento else f"\naquecimento: ERRO {aquecimento['erro']}")
+        for etapa, segundos in aquecimento.items():
+            if etapa != "erro":
+                print(f"    {etapa:<40}{segundos:>8.3f}s")
+
+
+if __name__ == "__main__":
+    args = _argumentos()
+    relatorio = {
+        "python": sys.version.split()[0],
+        "modulos": {modulo: perfil_do_modulo(modulo, args.top) for modulo in args.modulos},
+    }
+    if not args.sem_aquecimento:
+        relatorio["aquecimento"] = perfil_do_aquecimento()
+    imprimir_relatorio(relatorio)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as arquivo:
+            json.dump(relatorio, arquivo, ensure_ascii=False, indent=2)
@@ -0,0 +1,97 @@
+import re
+import json
+from typing import NamedTuple
+
+from pydantic import BaseModel, Field
+
+LETRAS_ALTERNATIVAS = "abcdefgh"
+# "c", "C)", "(c)", "c. texto", "c) texto" ou "Alternativa C" / "letra c"
+_LETRA_NO_INICIO = re.compile(r"^\(?([a-h])(?:$|[).:\-])") # "a soma é 5" não conta como "a"
+_LETRA_NOMEADA = re.compile(r"\b(?:alternativa|letra|op[cç][aã]o)\s*\(?([a-h])\b")
+
+
+# --- Esquema de Saída do agente_professor ---
+# Enviado ao Gemini como response schema: o modelo devolve JSON já no formato abaixo,
+# sem precisarmos interpretar a numeração de um texto em markdown.
+class QuestaoGerada(BaseModel):
+    id: int = Field(description="Número sequencial da questão, começando em 1.")
+    topico: str = Field(description="Nome do tópico a que a questão se refere.")
+    enunciado: str = Field(description="Enunciado completo da questão, sem as alternativas.")
+    alternativas: list[str] = Field(
+        description="Texto de cada alternativa, na ordem a), b), c)..., sem a letra. Lista vazia se a questão for discursiva."
+    )
+    gabarito: str = Field(
+        description="Para múltipla escolha, apenas a letra da alternativa correta (ex: 'c'). Para discursivas, a resposta esperada resumida."
+    )
+    referencia_resolucao: str = Field(
+        description="Conceito ou raciocínio central que justifica o gabarito, em uma frase."
+    )
+
+class ListaDeQuestoes(BaseModel):
+    questoes: list[QuestaoGerada]
+
+
+# --- Representação Compacta em Memória ---
+class Questao(NamedTuple):
+    id: int
+    topico: str
+    enunciado: str
+    alternativas: tuple
+    gabarito: str
+    referencia_resolucao: str
+
+    @property
+    def multipla_escolha(self) -> bool:
+        return bool(self.alternativas)
+
+    def letras(self) -> str:
+        return LETRAS_ALTERNATIVAS[:len(self.alternativas)]
+
+
+def extrair_letra(texto: str, letras: str) -> str:
+    # A letra de uma alternativa existente, ou "" se o texto não indicar uma sem ambiguidade.
+    # A letra do início vale primeiro: em "b) mas a alternativa c parece...", a resposta é "b".
+    texto = (texto or "").strip().lower()
+    encontrada = _LETRA_NO_INICIO.match(texto) or _LETRA_NOMEADA.search(texto)
+    if encontrada and encontrada[1] in letras:
+        return encontrada[1]
+    return ""
+
+def converter_questao(q: QuestaoGerada, id: int) -> Questao:
+    return Questao(
+        id=id,
+        topico=q.topico.strip(),
+        enunciado=q.enunciado.strip(),
+        alternativas=tuple(a.strip() for a in q.alternativas),
+        # Em múltipla escolha, só a letra; se não houver uma letra válida, o texto fica como veio
+        # e a questão é corrigida pelo agente_professor2 (ver correcao.py)
+        gabarito=extrair_letra(q.gabarito, LETRAS_ALTERNATIVAS[:len(q.alternativas)]) or q.gabarito.strip(),
+        referencia_resolucao=q.referencia_resolucao.strip(),
+    )
+
+def interpretar_questoes(texto_json: str) -> tuple:
+    # Lança pydantic.ValidationError se o modelo não respeitar o esquema. A numeração é refeita
+    # aqui: o modelo às vezes numera por tópico, e ids repetidos quebrariam as chaves dos campos
+    # de resposta e o dicionário de respostas da correção.
+    lista = ListaDeQuestoes.model_validate_json(texto_json.strip())
+    return tuple(converter_questao(q, numero) for numero, q in enumerate(lista.questoes, start=1))
+
+def serializar_questoes(questoes) -> str:
+    return json.dumps({"questoes": [q._asdict() for q in questoes]}, ensure_ascii=False, separators=(",", ":"))
+
+def formatar_questao(questao: Questao, com_gabarito: bool = False) -> str:
+    linhas = [f"{questao.id}. {questao.enunciado}"]
+    for letra, alternativa in zip(questao.letras(), questao.alternativas):
+        linhas.append(f"{letra}) {alternativa}")
+    if com_gabarito:
+        linhas.append(f"Gabarito: {questao.gabarito}")
+        linhas.append(f"Referência: {questao.referencia_resolucao}")
+    return "\n".join(linhas)
+
+def formatar_para_correcao(questoes, respostas: dict) -> str:
+    # Um registro curto por questão: enunciado, gabarito e a resposta do aluno lado a lado
+    blocos = []
+    for questao in questoes:
+        resposta = respostas.get(questao.id) or "(sem resposta)"
+        blocos.append(f"[{questao.topico}]\n{formatar_questao(questao, com_gabarito=True)}\nResposta do aluno: {resposta}")
+    return "\n\n".join(blocos)
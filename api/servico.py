@@ -0,0 +1,340 @@
+import os
+import asyncio
+import uuid
+import threading
+
+from google.genai import types
+
+from google.adk.agents import Agent
+from google.adk.agents.run_config import RunConfig, StreamingMode
+from google.adk.runners import Runner
+
+from agendador import obter_agendador, sessao_atual
+from agentes import obter_agente, obter_runner, obter_loop
+from banco_questoes import BancoQuestoes
+from cache_persistente import CachePersistente, normalizar_chave
+from correcao import corrigir_localmente, resumo_da_correcao_local
+from instrumentacao import medir_agente
+from questoes import interpretar_questoes, serializar_questoes, formatar_para_correcao
+from sessao_estudo import (
+    ENTRADA_NOVA_RODADA, SessaoDeEstudo, estado_inicial, descartar_historico,
+    entrada_de_reposicao, filtrar_repetidas,
+)
+
+# --- Camada de Serviço ---
+# O pipeline de estudos (estilo → tópicos → questões → correção) sem nada de Streamlit, usado pela
+# interface (streamlit_app.py) e pela API HTTP (api_http.py). As corrotinas daqui rodam sempre no
+# loop compartilhado de `agentes` (executar_no_loop, iterar_no_loop ou no_loop_compartilhado).
+# Como o Streamlit só permite usar `st.*` na thread do script, os erros são acumulados em `erros`
+# e exibidos (ou devolvidos) por quem chamou.
+
+TENTATIVAS_DE_REPOSICAO = int(os.getenv("ASSISTENTE_DUPLICATAS_TENTATIVAS", 1))
+SESSAO_DO_BANCO = "banco_questoes" # Usuário das gerações em segundo plano do banco de questões
+
+_trava = threading.RLock()
+_cache_estilo = None
+_cache_topicos = None
+_banco_questoes = None
+
+
+# --- Cache do Estilo da Prova ---
+# O estilo de provas como ENEM ou FUVEST quase não muda de uma semana para outra,
+# então evitamos repetir a busca no Google Search para cada usuário.
+def obter_cache_estilo() -> CachePersistente:
+    global _cache_estilo
+    with _trava:
+        if _cache_estilo is None:
+            _cache_estilo = CachePersistente(
+                namespace="estilo_prova",
+                ttl_segundos=float(os.getenv("ASSISTENTE_CACHE_ESTILO_TTL", 7 * 24 * 3600)),
+                max_itens=int(os.getenv("ASSISTENTE_CACHE_ESTILO_MAX_ITENS", 500)),
+            )
+        return _cache_estilo
+
+# --- Cache dos Tópicos Relevantes ---
+# Milhares de alunos pedem os mesmos pares (prova, matéria), como ("ENEM", "Matemática").
+def obter_cache_topicos() -> CachePersistente:
+    global _cache_topicos
+    with _trava:
+        if _cache_topicos is None:
+            _cache_topicos = CachePersistente(
+                namespace="topicos_relevantes",
+                ttl_segundos=float(os.getenv("ASSISTENTE_CACHE_TOPICOS_TTL", 7 * 24 * 3600)),
+                max_itens=int(os.getenv("ASSISTENTE_CACHE_TOPICOS_MAX_ITENS", 2000)),
+            )
+        return _cache_topicos
+
+def resposta_valida(resposta: str) -> bool:
+    texto = resposta.lower()
+    return not (
+        "erro ao processar" in texto
+        or "não produziu uma resposta" in texto
+        or "ocorreu um erro crítico" in texto
+    )
+
+
+# --- Execução dos Agentes ---
+def _preparar_execucao(agent: Agent, message_text: str, erros: list, user_session_id: str, estado=None, sessao_estudo=None):
+    runner = obter_runner(agent.name)
+    if sessao_estudo is not None:
+        # Sessão de estudo (ver sessao_estudo.py): o estado vem das rodadas anteriores
+        user_id, session_id = sessao_estudo
+    else:
+        # Sessão descartável dentro do session service compartilhado: cada chamada começa sem histórico
+        session_id = f"session_{user_session_id}_{uuid.uuid4().hex[:8]}"
+        user_id = "user_streamlit"
+        runner.session_service.create_session(app_name=runner.app_name, user_id=user_id, session_id=session_id, state=estado)
+
+    try:
+        content = types.Content(role="user", parts=[types.Part(text=message_text)])
+
+    except AttributeError as e_attr:
+        erros.append(f"Erro de atributo ao criar Content/Part com google.genai.types: {e_attr}")
+        erros.append("Verifique se a biblioteca 'google-genai' está instalada corretamente e se a sintaxe está alinhada com a documentação mais recente.")
+        return None
+    except Exception as e_general:
+        erros.append(f"Erro inesperado ao criar Content/Part: {e_general}")
+        return None
+    return runner, user_id, session_id, content
+
+def _encerrar_execucao(runner: Runner, user_id: str, session_id: str, sessao_estudo=None):
+    if sessao_estudo is not None:
+        descartar_historico(sessao_estudo)
+    else:
+        runner.session_service.delete_session(app_name=runner.app_name, user_id=user_id, session_id=session_id)
+
+async def call_agent_async(
+    agent: Agent, message_text: str, erros: list, user_session_id: str = "default",
+    estado: dict = None, sessao_estudo: SessaoDeEstudo = None,
+) -> str:
+    # `estado` inicializa a sessão descartável (variáveis das instruções do agente);
+    # com `sessao_estudo`, a chamada usa o estado daquela sessão.
+    sessao_atual.set(user_session_id) # Usada pelo agendador para dividir as vagas entre usuários
+    execucao = _preparar_execucao(agent, message_text, erros, user_session_id, estado, sessao_estudo)
+    if execucao is None:
+        return "Erro crítico: Falha ao construir mensagem para o agente."
+    runner, user_id, session_id, content = execucao
+
+    final_response = ""
+    with medir_agente(agent.name, streaming=False, segundo_plano=user_session_id == SESSAO_DO_BANCO) as medicao:
+        try:
+            async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=content):
+                medicao.registrar_evento(event)
+                if event.is_final_response():
+                    if event.content and event.content.parts:
+                        for part_item in event.content.parts:
+                            if part_item.text is not None:
+                                final_response += part_item.text
+                                final_response += "\n"
+                elif event.error_message:
+                    erros.append(f"Erro no agente {agent.name}: {event.error_message}")
+                    final_response += f"Erro ao processar: {event.error_message}\n"
+        except Exception as e_run:
+            medicao.registrar_erro(e_run)
+            erros.append(f"Exceção ao executar o agente {agent.name}: {e_run}")
+            return f"Ocorreu um erro crítico ao contatar o agente {agent.name}."
+        finally:
+            _encerrar_execucao(runner, user_id, session_id, sessao_estudo)
+
+    if not final_response.strip():
+        return "O agente não produziu uma resposta."
+    return final_response
+
+async def call_agent_stream_async(
+    agent: Agent, message_text: str, erros: list, user_session_id: str = "default",
+    estado: dict = None, sessao_estudo: SessaoDeEstudo = None,
+):
+    # Versão em streaming (SSE): entrega os pedaços de texto à medida que o modelo gera,
+    # em vez de esperar a resposta completa.
+    sessao_atual.set(user_session_id)
+    execucao = _preparar_execucao(agent, message_text, erros, user_session_id, estado, sessao_estudo)
+    if execucao is None:
+        yield "Erro crítico: Falha ao construir mensagem para o agente."
+        return
+    runner, user_id, session_id, content = execucao
+
+    run_config = RunConfig(streaming_mode=StreamingMode.SSE)
+    texto_parcial_emitido = False
+    with medir_agente(agent.name, streaming=True, segundo_plano=user_session_id == SESSAO_DO_BANCO) as medicao:
+        try:
+            async for event in runner.run_async(user_id=user_id, session_id=session_id, new_message=content, run_config=run_config):
+                medicao.registrar_evento(event)
+                if event.partial:
+                    if event.content and event.content.parts:
+                        for part_item in event.content.parts:
+                            if part_item.text:
+                                texto_parcial_emitido = True
+                                yield part_item.text
+                    continue
+
+                if event.is_final_response():
+                    # O evento final repete o texto já transmitido; só o usamos se nada veio em partes
+                    if not texto_parcial_emitido and event.content and event.content.parts:
+                        for part_item in event.content.parts:
+                            if part_item.text is not None:
+                                yield part_item.text
+                    yield "\n"
+                elif event.error_message:
+                    erros.append(f"Erro no agente {agent.name}: {event.error_message}")
+                    yield f"Erro ao processar: {event.error_message}\n"
+                texto_parcial_emitido = False
+        except Exception as e_run:
+            medicao.registrar_erro(e_run)
+            erros.append(f"Exceção ao executar o agente {agent.name}: {e_run}")
+            yield f"\n\nOcorreu um erro crítico ao contatar o agente {agent.name}."
+        finally:
+            _encerrar_execucao(runner, user_id, session_id, sessao_estudo)
+
+
+# --- Estilo e Tópicos ---
+# Passam pelos caches compartilhados: pedidos simultâneos para a mesma prova/matéria
+# resultam em uma única chamada ao agente, e os demais aguardam o mesmo resultado.
+async def buscar_estilo_async(prova, data_de_hoje, erros: list, user_session_id: str) -> str:
+    entrada_do_agente_buscador = f"Prova: {prova}\nData de hoje: {data_de_hoje}"
+    return await obter_cache_estilo().obter_ou_calcular(
+        normalizar_chave(prova),
+        lambda: call_agent_async(obter_agente("agente_buscador"), entrada_do_agente_buscador, erros, user_session_id),
+        deve_guardar=resposta_valida, # Nunca guardamos respostas de erro no cache
+    )
+
+async def buscar_topicos_async(prova, materia, erros: list, user_session_id: str) -> str:
+    entrada_do_agente_buscador2 = f"Prova: {prova}\nMatéria: {materia}"
+    return await obter_cache_topicos().obter_ou_calcular(
+        normalizar_chave(prova, materia),
+        lambda: call_agent_async(obter_agente("agente_buscador2"), entrada_do_agente_buscador2, erros, user_session_id),
+        deve_guardar=resposta_valida,
+    )
+
+async def buscar_estilo_e_topicos_async(prova, materia, data_de_hoje, erros_estilo: list, erros_topicos: list, user_session_id: str):
+    # Estilo e tópicos não dependem um do outro: buscamos os dois ao mesmo tempo.
+    # O tempo total passa a ser o do agente mais lento, e não a soma dos dois.
+    return await asyncio.gather(
+        buscar_estilo_async(prova, data_de_hoje, erros_estilo, user_session_id),
+        buscar_topicos_async(prova, materia, erros_topicos, user_session_id),
+    )
+
+
+# --- Questões ---
+# Estilo e tópicos entram nas instruções do agente_professor pelo estado da sessão (e vão por cache
+# de contexto, ver cache_de_contexto.py); a mensagem de cada rodada é sempre a mesma, curta.
+async def gerar_questoes_async(estilo_da_prova, topicos_relevantes, erros: list, user_session_id: str, sessao_estudo: SessaoDeEstudo = None):
+    # O agente responde em JSON (output_schema); devolve as questões já interpretadas e a resposta
+    # bruta, usada como detalhe quando a geração falha.
+    resposta = await call_agent_async(
+        obter_agente("agente_professor"),
+        ENTRADA_NOVA_RODADA,
+        erros,
+        user_session_id,
+        estado=estado_inicial(estilo_da_prova, topicos_relevantes),
+        sessao_estudo=sessao_estudo,
+    )
+    try:
+        questoes = interpretar_questoes(resposta)
+    except ValueError:
+        return (), resposta
+    if sessao_estudo is not None:
+        questoes = await _rodada_sem_repetidas(questoes, user_session_id, sessao_estudo)
+    return questoes, resposta
+
+async def _rodada_sem_repetidas(questoes, user_session_id: str, sessao_estudo: SessaoDeEstudo):
+    # Tira do lote as questões parecidas com as que o aluno já viu (ver duplicatas.py) e pede ao
+    # agente_professor só as que faltam, nos mesmos tópicos. A rodada sai renumerada de 1 a N.
+    novas, repetidas = filtrar_repetidas(sessao_estudo, questoes)
+    rodada = list(novas)
+    for _ in range(TENTATIVAS_DE_REPOSICAO if repetidas else 0):
+        # Falhar aqui não derruba a rodada, que segue com as questões que sobraram
+        resposta = await call_agent_async(
+            obter_agente("agente_professor"), entrada_de_reposicao(repetidas), [], user_session_id, sessao_estudo=sessao_estudo,
+        )
+        try:
+            reposicao, _ = filtrar_repetidas(sessao_estudo, interpretar_questoes(resposta), maximo=len(repetidas))
+        except ValueError:
+            continue
+        rodada.extend(reposicao)
+        repetidas = repetidas[len(reposicao):]
+        if not repetidas:
+            break
+    if not rodada:
+        return questoes # Melhor repetir do que deixar o aluno sem questões
+    return tuple(questao._replace(id=numero) for numero, questao in enumerate(rodada, start=1))
+
+async def proximas_questoes_async(
+    prova, materia, estilo_da_prova, topicos_relevantes, erros: list, user_session_id: str, sessao_estudo: SessaoDeEstudo = None,
+):
+    # Usa um lote pré-gerado do banco; só gera na hora se o estoque estiver vazio
+    # O SQLite roda numa thread auxiliar para não bloquear o loop compartilhado
+    lote_do_banco = await asyncio.to_thread(obter_banco_questoes().retirar, BancoQuestoes.chave(prova, materia, estilo_da_prova))
+    if lote_do_banco is not None:
+        questoes = interpretar_questoes(lote_do_banco)
+        if sessao_estudo is not None:
+            questoes = await _rodada_sem_repetidas(questoes, user_session_id, sessao_estudo)
+        return questoes, lote_do_banco
+    return await gerar_questoes_async(estilo_da_prova, topicos_relevantes, erros, user_session_id, sessao_estudo)
+
+
+# --- Banco de Questões ---
+# Lotes de questões gerados em segundo plano enquanto o aluno responde a rodada atual,
+# para que "Mais Questões" seja atendido na hora.
+async def _gerar_lote_para_banco(estilo_da_prova, topicos_relevantes):
+    erros = []
+    questoes = await call_agent_async(
+        obter_agente("agente_professor"),
+        ENTRADA_NOVA_RODADA,
+        erros,
+        SESSAO_DO_BANCO,
+        estado=estado_inicial(estilo_da_prova, topicos_relevantes),
+    )
+    if not resposta_valida(questoes):
+        return None
+    try:
+        return serializar_questoes(interpretar_questoes(questoes))
+    except ValueError:
+        return None
+
+def obter_banco_questoes() -> BancoQuestoes:
+    global _banco_questoes
+    with _trava:
+        if _banco_questoes is None:
+            _banco_questoes = BancoQuestoes(
+                gerar_lote=_gerar_lote_para_banco,
+                minimo=int(os.getenv("ASSISTENTE_BANCO_MINIMO", 1)),
+                alvo=int(os.getenv("ASSISTENTE_BANCO_ALVO", 2)),
+                ttl_segundos=float(os.getenv("ASSISTENTE_BANCO_TTL", 7 * 24 * 3600)),
+                espera_apos_falha=float(os.getenv("ASSISTENTE_BANCO_ESPERA_APOS_FALHA", 300)),
+            )
+        return _banco_questoes
+
+def preparar_proxima_rodada(prova, materia, estilo_da_prova, topicos_relevantes):
+    # Enquanto o aluno responde, já preparamos a próxima rodada em segundo plano
+    obter_banco_questoes().garantir_estoque(
+        BancoQuestoes.chave(prova, materia, estilo_da_prova), estilo_da_prova, topicos_relevantes, obter_loop()
+    )
+
+
+# --- Correção ---
+# Acertos de múltipla escolha são conferidos localmente; o agente só recebe, em um único
+# prompt, as questões erradas, em branco ou discursivas.
+def preparar_correcao(questoes, respostas_aluno: dict):
+    # Devolve a correção local, o resumo dela e a entrada do agente_professor2 (None se não houver pendências)
+    correcao_local = corrigir_localmente(questoes, respostas_aluno)
+    resumo_local = resumo_da_correcao_local(correcao_local)
+    if not correcao_local.pendentes:
+        return correcao_local, resumo_local, None
+    return correcao_local, resumo_local, formatar_para_correcao(correcao_local.pendentes, respostas_aluno)
+
+async def corrigir_respostas_stream_async(resumo_local: str, entrada_do_agente_professor2, erros: list, user_session_id: str):
+    # Recebe o resultado de preparar_correcao, para não corrigir duas vezes: o resumo local sai
+    # primeiro, na hora; a análise do agente vem em seguida, em streaming
+    if resumo_local:
+        yield resumo_local
+    if entrada_do_agente_professor2 is None:
+        return
+    if resumo_local:
+        yield "\n\n"
+    async for pedaco in call_agent_stream_async(obter_agente("agente_professor2"), entrada_do_agente_professor2, erros, user_session_id):
+        yield pedaco
+
+
+async def estatisticas_do_agendador():
+    # O agendador vive no loop compartilhado; lemos as métricas de dentro dele
+    return obter_agendador().estatisticas()
@@ -0,0 +1,77 @@
+import hashlib
+from typing import NamedTuple
+
+from agentes import obter_session_service
+from cache_persistente import normalizar_chave
+from duplicatas import RegistroDeIndices
+
+# --- Sessão de Estudo ---
+# Uma sessão do ADK por (usuário, prova, matéria), que sobrevive aos reruns do Streamlit e às
+# etapas do fluxo. O agente_professor roda nela: estilo e tópicos ficam no estado da sessão e
+# entram nas instruções dele; a mensagem de cada rodada é sempre a mesma, curta. As questões que
+# o aluno já viu ficam no índice de duplicatas da sessão, não no prompt.
+#
+# As instruções com estilo e tópicos são iguais em todas as rodadas (e entre alunos da mesma prova
+# e matéria), então vão por cache de contexto do Gemini (ver cache_de_contexto.py): da segunda
+# rodada em diante, a requisição leva o nome do cache e só a mensagem da rodada. O histórico bruto
+# (eventos) é descartado ao fim de cada chamada; a sessão expira pelo tempo ocioso ou ao encerrar.
+
+APP_DA_SESSAO = "agente_professor" # app_name do runner do agente_professor (ver obter_runner)
+ENTRADA_NOVA_RODADA = "Gere uma nova rodada de questões."
+
+_indices_de_questoes = RegistroDeIndices() # Questões já vistas, por sessão de estudo (ver duplicatas.py)
+
+
+class SessaoDeEstudo(NamedTuple):
+    user_id: str
+    session_id: str
+
+
+def estado_inicial(estilo_da_prova, topicos_relevantes) -> dict:
+    return {
+        "estilo_prova": estilo_da_prova,
+        "topicos_relevantes": topicos_relevantes,
+    }
+
+def _sessao(user_session_id: str, prova, materia) -> SessaoDeEstudo:
+    return SessaoDeEstudo(
+        user_id=user_session_id,
+        session_id="estudo_" + hashlib.sha1(normalizar_chave(prova, materia).encode("utf-8")).hexdigest()[:12],
+    )
+
+
+def abrir_sessao_de_estudo(user_session_id: str, prova, materia, estilo_da_prova, topicos_relevantes) -> SessaoDeEstudo:
+    sessao = _sessao(user_session_id, prova, materia)
+    servico = obter_session_service()
+    existente = servico.get_session(app_name=APP_DA_SESSAO, user_id=sessao.user_id, session_id=sessao.session_id)
+    if existente is None:
+        servico.create_session(
+            app_name=APP_DA_SESSAO, user_id=sessao.user_id, session_id=sessao.session_id,
+            state=estado_inicial(estilo_da_prova, topicos_relevantes),
+        )
+    elif (existente.state.get("estilo_prova"), existente.state.get("topicos_relevantes")) != (estilo_da_prova, topicos_relevantes):
+        servico.atualizar_estado(
+            APP_DA_SESSAO, sessao.user_id, sessao.session_id,
+            lambda estado: {"estilo_prova": estilo_da_prova, "topicos_relevantes": topicos_relevantes},
+        )
+    return sessao
+
+def encerrar_sessao_de_estudo(user_session_id: str, prova, materia):
+    sessao = _sessao(user_session_id, prova, materia)
+    obter_session_service().delete_session(app_name=APP_DA_SESSAO, user_id=sessao.user_id, session_id=sessao.session_id)
+    _indices_de_questoes.remover(sessao)
+
+
+def entrada_de_reposicao(repetidas) -> str:
+    topicos = ", ".join(dict.fromkeys(q.topico for q in repetidas))
+    return (
+        f"Gere apenas {len(repetidas)} questões novas, sobre os tópicos: {topicos}. "
+        "Evite as questões mais comuns sobre esses tópicos; o aluno já as resolveu."
+    )
+
+def filtrar_repetidas(sessao: SessaoDeEstudo, questoes, maximo: int = None):
+    # Devolve (novas, repetidas) em relação a tudo o que o aluno já viu nesta prova e matéria
+    return _indices_de_questoes.obter(sessao).filtrar_novas(questoes, maximo=maximo)
+
+def descartar_historico(sessao: SessaoDeEstudo):
+    obter_session_service().descartar_eventos(APP_DA_SESSAO, sessao.user_id, sessao.session_id)
@@ -1,16 +1,14 @@
 import streamlit as st
 import os
-from google import genai 
-from google.genai import types
-
-from google.adk.agents import Agent
-from google.adk.runners import Runner
-from google.adk.sessions import InMemorySessionService
-from google.adk.tools import google_search
+import uuid
 
 from datetime import date
 import warnings
 
+# google.adk, google.genai e o OpenTelemetry levam segundos para importar e a tela inicial não
+# precisa deles: `agentes`, `servico` e `instrumentacao` só são importados quando um agente é
+# chamado (ou antes, pelo aquecimento em aquecimento.py).
+
 warnings.filterwarnings("ignore")
 
 # --- Configuração da Página Streamlit ---
@@ -63,151 +61,117 @@ else:
     st.stop()
 
 
-# --- Função `call_agent`  ---
-def call_agent(agent: Agent, message_text: str, context: dict = None) -> str:
-    session_service = InMemorySessionService()
-    session_id = f"session_{st.session_state.get('user_session_id', 'default')}"
-    user_id = "user_streamlit"
+# --- Chamadas aos Agentes ---
+# O pipeline (agentes, caches, banco de questões e correção local) fica em `servico.py` e roda no
+# loop compartilhado de `agentes`. Aqui ficam só os spinners e a exibição dos erros acumulados.
+def mostrar_erros(erros: list):
+    for erro in erros:
+        st.error(erro)
 
-    session = session_service.create_session(app_name=agent.name, user_id=user_id, session_id=session_id)
-    runner = Runner(agent=agent, app_name=agent.name, session_service=session_service)
-
-    try:
-        content = types.Content(role="user", parts=[types.Part(text=message_text)])
-
-    except AttributeError as e_attr:
-        st.error(f"Erro de atributo ao criar Content/Part com google.genai.types: {e_attr}")
-        st.error("Verifique se a biblioteca 'google-genai' está instalada corretamente e se a sintaxe está alinhada com a documentação mais recente.")
-        return "Erro crítico: Falha ao construir mensagem para o agente."
-    except Exception as e_general:
-        st.error(f"Erro inesperado ao criar Content/Part: {e_general}")
-        return "Erro crítico: Falha ao construir mensagem para o agente."
+def sessao_de_estudo():
+    # O agente_professor continua de onde parou entre as rodadas da mesma prova e matéria
+    from sessao_estudo import abrir_sessao_de_estudo
+    return abrir_sessao_de_estudo(
+        st.session_state.get('user_session_id', 'default'), st.session_state.prova, st.session_state.materia,
+        st.session_state.estilo_prova, st.session_state.topicos_relevantes,
+    )
 
-    final_response = ""
-    try:
-        for event in runner.run(user_id=user_id, session_id=session_id, new_message=content):
-            if event.is_final_response():
-                if event.content and event.content.parts:
-                    for part_item in event.content.parts:
-                        if part_item.text is not None:
-                            final_response += part_item.text
-                            final_response += "\n"
-            elif event.error_message:
-                st.error(f"Erro no agente {agent.name}: {event.error_message}")
-                final_response += f"Erro ao processar: {event.error_message}\n"
-    except Exception as e_run:
-        st.error(f"Exceção ao executar o agente {agent.name}: {e_run}")
-        return f"Ocorreu um erro crítico ao contatar o agente {agent.name}."
-
-    if not final_response.strip():
+def call_agent_streaming(agent, message_text: str) -> str:
+    # Renderiza a resposta incrementalmente na página e devolve o texto completo
+    from agentes import iterar_no_loop
+    from servico import call_agent_stream_async
+    erros = []
+    user_session_id = st.session_state.get('user_session_id', 'default')
+    resposta = st.write_stream(iterar_no_loop(call_agent_stream_async(agent, message_text, erros, user_session_id)))
+    mostrar_erros(erros)
+    if not isinstance(resposta, str) or not resposta.strip():
         return "O agente não produziu uma resposta."
-    return final_response
+    return resposta
 
-# --- Definições dos Agentes (como no seu código original) ---
 def agente_buscador(prova, data_de_hoje):
-    buscador = Agent(
-        name="agente_buscador",
-        model="gemini-2.0-flash", # Usando modelo mais recente, ajuste se necessário
-        description="Agente que busca o estilo da prova.",
-        tools=[google_search],
-        instruction="""
-        Você é um especialista em análises de provas. Sua tarefa é investigar e descrever o estilo das questões de uma prova específica.
-        Use o Google Search para encontrar informações sobre o formato, características e tendências das questões das provas dos últimos 3 anos, a partir da data atual.
-        Sua resposta deve ser uma descrição clara e concisa do estilo da prova, mencionando:
-        - Tipo de questões predominantes (ex: múltipla escolha, discursivas, verdadeiro/falso).
-        - Nível de complexidade (ex: conceitual, aplicação, análise crítica).
-        - Presença de interdisciplinaridade.
-        - Se há pegadinhas comuns ou padrões de cobrança.
-        Este perfil do estilo é crucial para que outros agentes possam gerar questões coerentes e oferecer dicas eficazes.
-        """
-    )
-    entrada_do_agente_buscador = f"Prova: {prova}\nData de hoje: {data_de_hoje}"
+    from agentes import executar_no_loop
+    from servico import buscar_estilo_async
+    erros = []
+    user_session_id = st.session_state.get('user_session_id', 'default')
     with st.spinner(f"Buscando estilo da prova {prova}..."):
-        estilo = call_agent(buscador, entrada_do_agente_buscador)
+        estilo = executar_no_loop(buscar_estilo_async(prova, data_de_hoje, erros, user_session_id))
+    mostrar_erros(erros)
     return estilo
 
 def agente_buscador2(prova, materia):
-    buscador2 = Agent(
-        name="agente_buscador2",
-        model="gemini-2.0-flash",
-        description="Agente que busca os tópicos mais relevantes da prova.",
-        tools=[google_search],
-        instruction="""
-        Você é um analista de conteúdo de provas e especialista no Princípio de Pareto (80/20).
-        Sua missão é identificar os tópicos mais relevantes e de alta incidência para uma prova e matéria específicas.
-        Use o Google Search para encontrar informações sobre questões e assuntos cobrados com mais frequência nos últimos anos dessa prova e matéria.
-        Aplique o Princípio de Pareto para destilar os 20% dos tópicos que, se dominados, trarão 80% dos resultados esperados.
-        Além disso, pesquise por assuntos da atualidade que tenham maior probabilidade de serem cobrados na prova, considerando a matéria.
-        O resultado deve ser uma lista clara e numerada dos tópicos mais relevantes, pronta para ser usada por um professor para formular questões.
-        """
-    )
-    entrada_do_agente_buscador2 = f"Prova: {prova}\nMatéria: {materia}"
+    from agentes import executar_no_loop
+    from servico import buscar_topicos_async
+    erros = []
+    user_session_id = st.session_state.get('user_session_id', 'default')
     with st.spinner(f"Buscando tópicos relevantes para {materia} na prova {prova}..."):
-        topicos_relevantes = call_agent(buscador2, entrada_do_agente_buscador2)
+        topicos_relevantes = executar_no_loop(buscar_topicos_async(prova, materia, erros, user_session_id))
+    mostrar_erros(erros)
     return topicos_relevantes
 
+def agentes_buscadores(prova, materia, data_de_hoje):
+    from agentes import executar_no_loop
+    from servico import buscar_estilo_e_topicos_async
+    erros_estilo, erros_topicos = [], []
+    user_session_id = st.session_state.get('user_session_id', 'default')
+    with st.spinner(f"Buscando estilo da prova {prova} e tópicos relevantes para {materia}..."):
+        estilo, topicos_relevantes = executar_no_loop(
+            buscar_estilo_e_topicos_async(prova, materia, data_de_hoje, erros_estilo, erros_topicos, user_session_id)
+        )
+    mostrar_erros(erros_estilo)
+    mostrar_erros(erros_topicos)
+    return estilo, topicos_relevantes
+
 def agente_professor(estilo_da_prova, topicos_relevantes):
-    professor = Agent(
-        name="agente_professor",
-        model="gemini-2.0-flash",
-        description="Agente professor que formula questões",
-        instruction="""
-        Você é um professor especialista e mestre na formulação de questões de prova.
-        Com base no ESTILO DA PROVA e nos TÓPICOS MAIS RELEVANTES fornecidos, sua tarefa é criar 3 questões desafiadoras e no formato da prova para CADA UM dos tópicos listados.
-        Assegure que as questões sejam:
-        - Claras, objetivas e sem ambiguidades.
-        - Abrangentes, cobrindo diferentes aspectos dos tópicos.
-        - Totalmente alinhadas ao nível de complexidade e tipo de raciocínio exigido pelo ESTILO DA PROVA.
-        Apresente as questões de forma organizada, numerando-as sequencialmente e indicando a qual tópico cada conjunto de 3 questões se refere.
-        **IMPORTANTE PARA FORMATAÇÃO DE MÚLTIPLA ESCOLHA:**
-        Se a questão for de múltipla escolha, apresente cada alternativa (por exemplo, a), b), c), d), e)) em uma **NOVA LINHA**.
-        Exemplo de formatação desejada para uma questão de múltipla escolha:
-       [Nome do Tópico em Negrito]
-
-        1. [Enunciado da Pergunta]?
-        a) [Alternativa A] 
-
-        b) [Alternativa B]
-
-        c) [Alternativa C]
-
-        d) [Alternativa D]
-
-        e) [Alternativa E]
-
-        Ainda que sejam 3 questões por tópico, a numareção das questões vai de 1-15.
-        """
-    )
-    entrada_do_agente_professor = f"Estilo da prova: {estilo_da_prova}\nTópicos relevantes: {topicos_relevantes}"
+    from agentes import executar_no_loop
+    from servico import gerar_questoes_async
+    erros = []
+    user_session_id = st.session_state.get('user_session_id', 'default')
+    with st.spinner("Gerando questões..."):
+        questoes, resposta = executar_no_loop(
+            gerar_questoes_async(estilo_da_prova, topicos_relevantes, erros, user_session_id, sessao_de_estudo())
+        )
+    mostrar_erros(erros)
+    return questoes, resposta
+
+def mais_questoes():
+    from agentes import executar_no_loop
+    from servico import proximas_questoes_async
+    erros = []
+    user_session_id = st.session_state.get('user_session_id', 'default')
     with st.spinner("Gerando questões..."):
-        questoes = call_agent(professor, entrada_do_agente_professor)
-    return questoes
+        questoes, resposta = executar_no_loop(proximas_questoes_async(
+            st.session_state.prova, st.session_state.materia,
+            st.session_state.estilo_prova, st.session_state.topicos_relevantes,
+            erros, user_session_id, sessao_de_estudo(),
+        ))
+    mostrar_erros(erros)
+    return questoes, resposta
 
 def agente_professor2(questoes, respostas_aluno):
-    professor2 = Agent(
-        name="agente_professor2",
-        model="gemini-2.0-flash",
-        description="Agente professor2 para corrigir e explicar as questões",
-        instruction="""
-        Você é um professor especialista e um avaliador perspicaz. Sua função é analisar as RESPOSTAS do aluno às QUESTÕES propostas.
-        Para cada questão, você deve seguir este formato rigoroso:
-
-        1.  **Avaliação da Resposta:** Indique claramente se a resposta do aluno está `Correta`, `Incorreta` ou `Parcialmente Correta`. Justifique brevemente essa avaliação.
-        2.  **Resolução Passo a Passo:** Apresente a solução completa e detalhada para a questão, explicando cada etapa do raciocínio e os conceitos teóricos envolvidos de forma didática. Imagine que você está ensinando a resolução do zero.
-        Na medida do possível, passe 'macetes' conhecidos, populares entre os professóres do ensino médio, para ajudar na memorização. 
-        Por exemplo: F=m.a é a fórmula da fama; C=2πr é a fórmula do 'catupyri' (catwopiri)...
-        3.  **Análise de Desempenho e Dicas Personalizadas:** Com base na resposta do aluno, identifique onde ele errou (seja conceitual, de cálculo, interpretação, etc.) ou onde ele acertou e poderia ter aprofundado. Ofereça dicas de estudo **direcionadas** para as dificuldades observadas, sugerindo:
-            - Tópicos específicos para revisão aprofundada.
-            - Estratégias para abordar questões similares no futuro.
-            - Pontos de atenção para evitar erros comuns.
-            - Recursos adicionais, se aplicável (ex: "Revise o conceito X de Y").
-        Seu feedback deve ser construtivo, encorajador e focado em guiar o aluno para a melhoria contínua.
-        """
-    )
-    entrada_do_agente_professor2 = f"Questões:\n{questoes}\n\nRespostas do aluno:\n{respostas_aluno}"
+    from agentes import obter_agente
+    from servico import preparar_correcao
+    _, resumo_local, entrada_do_agente_professor2 = preparar_correcao(questoes, respostas_aluno)
+    if resumo_local:
+        st.markdown(resumo_local)
+    if entrada_do_agente_professor2 is None:
+        return resumo_local
+
     with st.spinner("Corrigindo e analisando suas respostas..."):
-        correcao = call_agent(professor2, entrada_do_agente_professor2)
-    return correcao
+        correcao = call_agent_streaming(obter_agente("agente_professor2"), entrada_do_agente_professor2)
+    return f"{resumo_local}\n\n{correcao}" if resumo_local else correcao
+
+def iniciar_rodada(questoes):
+    st.session_state.questoes_geradas = questoes
+    st.session_state.respostas_usuario = {} # Limpa respostas anteriores
+    st.session_state.correcao_exercicios = "" # Limpa correções anteriores
+    st.session_state.rodada_questoes = uuid.uuid4().hex[:8] # Novas chaves para os campos de resposta
+    if questoes:
+        # Enquanto o aluno responde, já preparamos a próxima rodada em segundo plano. Uma vez por
+        # rodada, e não a cada rerun (cada clique ou tecla na página de respostas).
+        from servico import preparar_proxima_rodada
+        preparar_proxima_rodada(
+            st.session_state.prova, st.session_state.materia, st.session_state.estilo_prova, st.session_state.topicos_relevantes
+        )
 
 # --- Inicialização do Estado da Sessão ---
 if 'etapa' not in st.session_state:
@@ -221,9 +185,11 @@ if 'estilo_prova' not in st.session_state:
 if 'topicos_relevantes' not in st.session_state:
     st.session_state.topicos_relevantes = ""
 if 'questoes_geradas' not in st.session_state:
-    st.session_state.questoes_geradas = ""
+    st.session_state.questoes_geradas = ()
 if 'respostas_usuario' not in st.session_state:
-    st.session_state.respostas_usuario = ""
+    st.session_state.respostas_usuario = {}
+if 'rodada_questoes' not in st.session_state:
+    st.session_state.rodada_questoes = ""
 if 'correcao_exercicios' not in st.session_state:
     st.session_state.correcao_exercicios = ""
 if 'user_session_id' not in st.session_state: # Para diferenciar chamadas de API
@@ -233,6 +199,29 @@ if 'user_session_id' not in st.session_state: # Para diferenciar chamadas de API
 # --- Lógica da Aplicação UI ---
 st.title("🚀 Assistente de Estudos Personalizado 🚀")
 
+# Métricas operacionais (opcional, para dimensionar caches)
+if os.getenv("ASSISTENTE_MOSTRAR_METRICAS") == "1":
+    from agentes import obter_session_service, executar_no_loop
+    from cache_de_contexto import obter_cache_de_contexto
+    from instrumentacao import agregador
+    from servico import obter_cache_estilo, obter_cache_topicos, estatisticas_do_agendador
+    with st.sidebar.expander("📊 Cache do estilo da prova"):
+        st.json(obter_cache_estilo().estatisticas())
+    with st.sidebar.expander("📚 Cache dos tópicos relevantes"):
+        st.json(obter_cache_topicos().estatisticas())
+    with st.sidebar.expander("🧩 Cache de contexto do Gemini"):
+        st.json(obter_cache_de_contexto().estatisticas())
+    with st.sidebar.expander("🧠 Sessões de agentes"):
+        st.json({"sessoes_ativas": obter_session_service().total_sessoes()})
+    with st.sidebar.expander("🚦 Fila de requisições ao Gemini"):
+        st.json(executar_no_loop(estatisticas_do_agendador()))
+    with st.sidebar.expander("⏱️ Latência por agente"):
+        latencias = agregador.estatisticas()
+        if latencias:
+            st.dataframe([{"agente": nome, **valores} for nome, valores in latencias.items()], hide_index=True)
+        else:
+            st.caption("Nenhuma chamada medida ainda.")
+
 data_de_hoje_str = date.today().strftime("%d/%m/%Y")
 
 # ETAPA 1: Escolher Prova e Matéria
@@ -250,23 +239,23 @@ if st.session_state.etapa == "inicio":
             st.session_state.prova_temp = prova_input # Salva para preencher se voltar
             st.session_state.materia_temp = materia_input
 
-            st.session_state.estilo_prova = agente_buscador(st.session_state.prova, data_de_hoje_str)
+            st.session_state.estilo_prova, st.session_state.topicos_relevantes = agentes_buscadores(
+                st.session_state.prova, st.session_state.materia, data_de_hoje_str
+            )
             if "erro ao processar" in st.session_state.estilo_prova.lower() or "não produziu uma resposta" in st.session_state.estilo_prova.lower() :
                  st.error(f"Não foi possível obter o estilo da prova. Verifique o nome da prova ou tente novamente. Detalhe: {st.session_state.estilo_prova}")
                  st.stop() # Interrompe se o primeiro agente falhar criticamente
 
-            st.session_state.topicos_relevantes = agente_buscador2(st.session_state.prova, st.session_state.materia)
             if "erro ao processar" in st.session_state.topicos_relevantes.lower() or "não produziu uma resposta" in st.session_state.topicos_relevantes.lower():
                  st.error(f"Não foi possível obter os tópicos relevantes. Verifique a matéria ou tente novamente. Detalhe: {st.session_state.topicos_relevantes}")
                  st.stop()
 
-            st.session_state.questoes_geradas = agente_professor(st.session_state.estilo_prova, st.session_state.topicos_relevantes)
-            if "erro ao processar" in st.session_state.questoes_geradas.lower() or "não produziu uma resposta" in st.session_state.questoes_geradas.lower():
-                 st.error(f"Não foi possível gerar as questões. Tente novamente. Detalhe: {st.session_state.questoes_geradas}")
+            questoes, resposta_professor = agente_professor(st.session_state.estilo_prova, st.session_state.topicos_relevantes)
+            if not questoes:
+                 st.error(f"Não foi possível gerar as questões. Tente novamente. Detalhe: {resposta_professor}")
                  st.stop()
 
-            st.session_state.respostas_usuario = "" # Limpa respostas anteriores
-            st.session_state.correcao_exercicios = "" # Limpa correções anteriores
+            iniciar_rodada(questoes)
             st.session_state.etapa = "responder_questoes"
             st.rerun()
         else:
@@ -283,16 +272,31 @@ elif st.session_state.etapa == "responder_questoes":
         st.markdown(st.session_state.topicos_relevantes)
 
     st.subheader("✍️ Questões Geradas:")
-    st.markdown(st.session_state.questoes_geradas)
-
-    st.session_state.respostas_usuario = st.text_area(
-        "Digite suas respostas aqui. Procure numerá-las de acordo com as questões.",
-        height=300,
-        value=st.session_state.respostas_usuario
-    )
+    respostas = {}
+    topico_atual = None
+    for questao in st.session_state.questoes_geradas:
+        if questao.topico != topico_atual:
+            topico_atual = questao.topico
+            st.markdown(f"**{topico_atual}**")
+        st.markdown(f"{questao.id}. {questao.enunciado}")
+        chave_resposta = f"resposta_{st.session_state.rodada_questoes}_{questao.id}"
+        if questao.multipla_escolha:
+            alternativas = dict(zip(questao.letras(), questao.alternativas))
+            escolha = st.radio(
+                f"Resposta da questão {questao.id}",
+                options=list(alternativas),
+                format_func=lambda letra, alternativas=alternativas: f"{letra}) {alternativas[letra]}",
+                index=None,
+                key=chave_resposta,
+                label_visibility="collapsed",
+            )
+        else:
+            escolha = st.text_area(f"Resposta da questão {questao.id}", key=chave_resposta, height=120)
+        respostas[questao.id] = escolha or ""
+    st.session_state.respostas_usuario = respostas
 
     if st.button("Enviar Respostas e Corrigir 🧐"):
-        if st.session_state.respostas_usuario.strip():
+        if any(resposta.strip() for resposta in st.session_state.respostas_usuario.values()):
             st.session_state.correcao_exercicios = agente_professor2(
                 st.session_state.questoes_geradas,
                 st.session_state.respostas_usuario
@@ -312,26 +316,25 @@ elif st.session_state.etapa == "ver_correcao":
 
     with col1:
         if st.button("Mais Questões (mesma matéria) 🔁"):
-            # Gera novas questões para a mesma matéria e prova
-            st.session_state.questoes_geradas = agente_professor(
-                st.session_state.estilo_prova,
-                st.session_state.topicos_relevantes
-            )
-            st.session_state.respostas_usuario = ""
-            st.session_state.correcao_exercicios = ""
-            st.session_state.etapa = "responder_questoes"
-            st.rerun()
+            # Usa um lote pré-gerado do banco; só gera na hora se o estoque estiver vazio
+            questoes, resposta_professor = mais_questoes()
+            if questoes:
+                iniciar_rodada(questoes)
+                st.session_state.etapa = "responder_questoes"
+                st.rerun()
+            else:
+                st.error(f"Não foi possível gerar novas questões. Tente novamente. Detalhe: {resposta_professor}")
     with col2:
         if st.button("Estudar Outra Matéria 📚"):
             st.session_state.etapa = "nova_materia"
             st.session_state.materia = "" # Limpa matéria anterior
             st.session_state.topicos_relevantes = ""
-            st.session_state.questoes_geradas = ""
-            st.session_state.respostas_usuario = ""
-            st.session_state.correcao_exercicios = ""
+            iniciar_rodada(())
             st.rerun()
     with col3:
         if st.button("Encerrar Sessão 👋"):
+            from sessao_estudo import encerrar_sessao_de_estudo
+            encerrar_sessao_de_estudo(st.session_state.user_session_id, st.session_state.prova, st.session_state.materia)
             st.session_state.etapa = "inicio" # Volta para o início
             st.session_state.prova = ""
             st.session_state.materia = ""
@@ -358,12 +361,11 @@ elif st.session_state.etapa == "nova_materia":
                  st.error(f"Não foi possível obter os tópicos para a nova matéria. Detalhe: {st.session_state.topicos_relevantes}")
                  # Não para, permite tentar de novo ou voltar
             else:
-                st.session_state.questoes_geradas = agente_professor(st.session_state.estilo_prova, st.session_state.topicos_relevantes)
-                if "erro ao processar" in st.session_state.questoes_geradas.lower() or "não produziu uma resposta" in st.session_state.questoes_geradas.lower():
-                    st.error(f"Não foi possível gerar questões para a nova matéria. Detalhe: {st.session_state.questoes_geradas}")
+                questoes, resposta_professor = agente_professor(st.session_state.estilo_prova, st.session_state.topicos_relevantes)
+                if not questoes:
+                    st.error(f"Não foi possível gerar questões para a nova matéria. Detalhe: {resposta_professor}")
                 else:
-                    st.session_state.respostas_usuario = ""
-                    st.session_state.correcao_exercicios = ""
+                    iniciar_rodada(questoes)
                     st.session_state.etapa = "responder_questoes"
                     st.rerun()
         else: